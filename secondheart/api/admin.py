@@ -1,4 +1,16 @@
+import io
+import json
+import marshal
+import pstats
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 from .models import (
     Patient,
     Doctor,
@@ -6,11 +18,226 @@ from .models import (
     WorkingHours,
     ScheduleSlot,
     Appointment,
+    ScheduleException,
+    Job,
+    RequestProfile,
+    ReminderOutbox,
 )
 
-admin.site.register(Patient)
-admin.site.register(Doctor)
-admin.site.register(Specialty)
-admin.site.register(WorkingHours)
-admin.site.register(ScheduleSlot)
-admin.site.register(Appointment)
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для таблиц на миллионы строк: вместо точного COUNT(*)
+    без фильтров берет оценку из статистики Postgres (pg_class.reltuples),
+    с фильтрами считает строки только до COUNT_LIMIT.
+    """
+    COUNT_LIMIT = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            # reltuples = -1, если таблицу еще не анализировали
+            if row and row[0] > self.COUNT_LIMIT:
+                return row[0]
+        return queryset[:self.COUNT_LIMIT].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Не считаем строки всей таблицы ради надписи "N всего"
+    show_full_result_count = False
+
+
+@admin.register(Specialty)
+class SpecialtyAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name')
+    search_fields = ('name',)
+
+
+@admin.register(Patient)
+class PatientAdmin(LargeTableAdmin):
+    list_display = ('id', 'full_name', 'phone_number', 'date_of_birth')
+    list_select_related = ('user',)
+    search_fields = ('user__username', 'user__last_name', 'phone_number')
+    raw_id_fields = ('user',)
+
+    @admin.display(description='Full name', ordering='user__last_name')
+    def full_name(self, obj):
+        return obj.user.get_full_name()
+
+
+@admin.register(Doctor)
+class DoctorAdmin(admin.ModelAdmin):
+    list_display = ('id', 'full_name', 'specialty', 'appointment_duration', 'is_active')
+    list_select_related = ('user', 'specialty')
+    list_filter = ('is_active', 'specialty')
+    search_fields = ('user__username', 'user__last_name')
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('specialty',)
+
+    @admin.display(description='Full name', ordering='user__last_name')
+    def full_name(self, obj):
+        return obj.user.get_full_name()
+
+
+@admin.register(WorkingHours)
+class WorkingHoursAdmin(admin.ModelAdmin):
+    list_display = ('id', 'doctor_name', 'day_of_week', 'start_time', 'end_time')
+    list_select_related = ('doctor__user',)
+    list_filter = ('day_of_week',)
+    autocomplete_fields = ('doctor',)
+
+    @admin.display(description='Doctor', ordering='doctor__user__last_name')
+    def doctor_name(self, obj):
+        return obj.doctor.user.get_full_name()
+
+
+@admin.register(ScheduleException)
+class ScheduleExceptionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'doctor_name', 'kind', 'date_from', 'date_to', 'start_time', 'end_time', 'reason')
+    list_select_related = ('doctor__user',)
+    list_filter = ('kind',)
+    autocomplete_fields = ('doctor',)
+
+    @admin.display(description='Doctor', ordering='doctor__user__last_name')
+    def doctor_name(self, obj):
+        return obj.doctor.user.get_full_name()
+
+
+@admin.register(ScheduleSlot)
+class ScheduleSlotAdmin(LargeTableAdmin):
+    list_display = ('id', 'doctor_name', 'date', 'start_time', 'end_time', 'status')
+    list_select_related = ('doctor__user',)
+    # Фильтры только по индексированным полям (slot_status_date_idx, slot_date_time_idx).
+    # Вместо date_hierarchy - фиксированные диапазоны дат: date_hierarchy строит ссылки
+    # запросом SELECT DISTINCT по всей таблице на каждой странице списка
+    list_filter = ('status', ('date', admin.DateFieldListFilter))
+    ordering = ('-date', '-start_time')
+    autocomplete_fields = ('doctor',)
+
+    @admin.display(description='Doctor')
+    def doctor_name(self, obj):
+        return obj.doctor.user.get_full_name()
+
+
+@admin.register(Appointment)
+class AppointmentAdmin(LargeTableAdmin):
+    list_display = ('id', 'patient_name', 'doctor_name', 'slot_date', 'slot_time', 'status', 'created_at')
+    list_select_related = ('patient__user', 'slot__doctor__user')
+    list_filter = ('status', ('created_at', admin.DateFieldListFilter))
+    ordering = ('-created_at',)
+    autocomplete_fields = ('patient',)
+    # Слотов миллионы - выбираем по id, без выпадающего списка
+    raw_id_fields = ('slot',)
+
+    @admin.display(description='Patient')
+    def patient_name(self, obj):
+        return obj.patient.user.get_full_name()
+
+    @admin.display(description='Doctor')
+    def doctor_name(self, obj):
+        return obj.slot.doctor.user.get_full_name()
+
+    @admin.display(description='Date')
+    def slot_date(self, obj):
+        return obj.slot.date
+
+    @admin.display(description='Time')
+    def slot_time(self, obj):
+        return obj.slot.start_time
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'total', 'created_at', 'heartbeat_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    ordering = ('-created_at',)
+    raw_id_fields = ('created_by',)
+
+
+@admin.register(ReminderOutbox)
+class ReminderOutboxAdmin(LargeTableAdmin):
+    list_display = ('id', 'appointment_id', 'kind', 'channel', 'recipient', 'status', 'attempts', 'created_at',
+                    'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'kind', 'channel')
+    ordering = ('-id',)
+    raw_id_fields = ('appointment',)
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'sql_count',
+                    'sql_ms', 'trigger', 'downloads')
+    list_filter = ('trigger', 'method', 'view_name')
+    search_fields = ('path', 'view_name')
+    ordering = ('-id',)
+    exclude = ('pstats', 'queries')
+    readonly_fields = ('path', 'method', 'view_name', 'status_code', 'duration_ms', 'sql_count', 'sql_ms', 'trigger',
+                       'user', 'created_at', 'downloads', 'top_functions', 'slowest_queries')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        # Бинарный профиль и список SQL в списке не нужны
+        return super().get_queryset(request).defer('pstats', 'queries')
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/pstats/', self.admin_site.admin_view(self.download_pstats),
+                 name='api_requestprofile_pstats'),
+            path('<int:pk>/sql/', self.admin_site.admin_view(self.download_sql), name='api_requestprofile_sql'),
+        ] + super().get_urls()
+
+    def download_pstats(self, request, pk):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(bytes(profile.pstats), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{pk}.pstats"'
+        return response
+
+    def download_sql(self, request, pk):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(json.dumps(profile.queries, ensure_ascii=False, indent=1),
+                                content_type='application/json')
+        response['Content-Disposition'] = f'attachment; filename="profile-{pk}-sql.json"'
+        return response
+
+    @admin.display(description='Download')
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">pstats</a> | <a href="{}">sql</a>',
+            reverse('admin:api_requestprofile_pstats', args=[obj.pk]),
+            reverse('admin:api_requestprofile_sql', args=[obj.pk]),
+        )
+
+    @admin.display(description='Top functions (cumulative)')
+    def top_functions(self, obj):
+        stats = pstats.Stats(_MarshalledProfile(bytes(obj.pstats)), stream=io.StringIO())
+        stats.sort_stats('cumulative').print_stats(30)
+        return format_html('<pre>{}</pre>', stats.stream.getvalue())
+
+    @admin.display(description='Slowest queries')
+    def slowest_queries(self, obj):
+        queries = sorted(obj.queries, key=lambda query: query['ms'], reverse=True)[:20]
+        return format_html('<pre>{}</pre>', '\n\n'.join(f"{q['ms']:.1f} ms  {q['sql']}" for q in queries))
+
+
+class _MarshalledProfile:
+    """Обертка для pstats.Stats: принимает объект с методом create_stats() и атрибутом stats."""
+
+    def __init__(self, data):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
@@ -0,0 +1,35 @@
+from .models import AgendaEntry
+
+
+def _entry_fields(slot, appointment=None):
+    fields = {
+        'doctor_id': slot.doctor_id,
+        'date': slot.date,
+        'start_time': slot.start_time,
+        'end_time': slot.end_time,
+        'status': slot.status,
+        'appointment_id': None,
+        'patient_name': '',
+        'patient_phone': '',
+    }
+    if appointment is not None:
+        patient = appointment.patient
+        fields['appointment_id'] = appointment.id
+        fields['patient_name'] = patient.user.get_full_name()
+        fields['patient_phone'] = patient.phone_number
+    return fields
+
+
+def add_slots(slots):
+    """Добавляет строки для только что сгенерированных (свободных) слотов одним запросом."""
+    AgendaEntry.objects.bulk_create(
+        [AgendaEntry(slot=slot, **_entry_fields(slot)) for slot in slots]
+    )
+
+
+def sync_slot(slot, appointment=None):
+    """
+    Приводит строку расписания к текущему состоянию слота.
+    Вызывается внутри той же транзакции, что и изменение слота/записи.
+    """
+    AgendaEntry.objects.update_or_create(slot=slot, defaults=_entry_fields(slot, appointment))
@@ -0,0 +1,142 @@
+"""
+Аналитика загрузки врачей.
+
+DailyUtilization - сводка по врачу за день. rollup_changed() пересчитывает только дни, у которых
+DailySlotCounter.changed_at новее водяного знака (счетчик дня трогает любое изменение его слотов
+и записей, см. api/counters.py), поэтому живые таблицы слотов и записей читаются лишь по измененным дням.
+Эндпоинт /api/analytics/utilization/ агрегирует только таблицу сводок.
+"""
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Checkpoint, DailySlotCounter, DailyUtilization, ScheduleSlot
+
+CHECKPOINT = 'analytics.rollup'
+# Транзакция, начавшаяся до прошлого прохода, могла зафиксировать изменения позже него:
+# такие дни подхватываем, перечитывая окно с запасом (пересчет идемпотентен)
+WATERMARK_LAG = timedelta(minutes=5)
+
+SLOT_FIELDS = ('free', 'held', 'booked', 'completed', 'cancelled')
+COUNT_FIELDS = ('slots',) + SLOT_FIELDS + ('appointments', 'attended', 'no_show', 'appointments_cancelled')
+GROUPS = {
+    'doctor': ('doctor_id', 'doctor__user__first_name', 'doctor__user__last_name'),
+    'specialty': ('specialty_id', 'specialty__name'),
+    'week': ('week',),
+    'day': ('date',),
+}
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _compute(keys):
+    """Считает сводки по слотам и записям для набора (doctor_id, date)."""
+    doctor_ids = {doctor_id for doctor_id, _ in keys}
+    dates = [day for _, day in keys]
+    rows = (
+        ScheduleSlot.objects.filter(doctor_id__in=doctor_ids, date__range=(min(dates), max(dates)))
+        .values('doctor_id', 'date', specialty_id=F('doctor__specialty_id'))
+        .annotate(
+            slots=Count('id'),
+            **{status: Count('id', filter=Q(status=status)) for status in SLOT_FIELDS},
+            appointments=Count('appointment'),
+            attended=Count('appointment', filter=Q(appointment__status='completed')),
+            no_show=Count('appointment', filter=Q(appointment__status='no_show')),
+            appointments_cancelled=Count('appointment', filter=Q(appointment__status='cancelled')),
+        )
+        .order_by()
+    )
+    # Запрос берет прямоугольник врачи x даты - лишние пары отбрасываем
+    return [row for row in rows if (row['doctor_id'], row['date']) in keys]
+
+
+def rollup_days(keys):
+    """Пересчитывает сводки для дней `keys`; дни без слотов удаляются из сводок."""
+    keys = set(keys)
+    rows = _compute(keys)
+    with transaction.atomic():
+        DailyUtilization.objects.bulk_create(
+            [DailyUtilization(week=week_start(row['date']), **row) for row in rows],
+            update_conflicts=True,
+            unique_fields=['doctor', 'date'],
+            update_fields=['specialty', 'week', *COUNT_FIELDS, 'updated_at'],
+        )
+        empty = keys - {(row['doctor_id'], row['date']) for row in rows}
+        for doctor_id, day in empty:
+            DailyUtilization.objects.filter(doctor_id=doctor_id, date=day).delete()
+    return len(keys)
+
+
+def rollup_changed(batch_size=500, full=False):
+    """
+    Пересчитывает дни, измененные с прошлого прохода (full=True - все дни).
+    Водяной знак сдвигается только после успешной обработки всех пачек.
+    Возвращает {'days': ..., 'seconds': ...}.
+    """
+    started = time.perf_counter()
+    run_started = timezone.now()
+    checkpoint, _ = Checkpoint.objects.get_or_create(name=CHECKPOINT)
+    watermark = checkpoint.value.get('changed_until')
+
+    changed = DailySlotCounter.objects.values_list('doctor_id', 'date')
+    if watermark and not full:
+        changed = changed.filter(changed_at__gt=datetime.fromisoformat(watermark) - WATERMARK_LAG)
+    # Сортировка по дате держит прямоугольник врачи x даты каждой пачки узким
+    changed = changed.order_by('date', 'doctor_id').iterator(chunk_size=batch_size)
+
+    days = 0
+    while True:
+        batch = list(islice(changed, batch_size))
+        if not batch:
+            break
+        days += rollup_days(batch)
+
+    checkpoint.value = {'changed_until': run_started.isoformat()}
+    checkpoint.save(update_fields=['value', 'updated_at'])
+    return {'days': days, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+def _ratio(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def utilization(group_by, date_from, date_to, doctor_ids=None, specialty_id=None):
+    """
+    Сводка за период с разбивкой по `group_by` (ключи GROUPS) и долями:
+    booked_ratio - занятые и состоявшиеся слоты от всех, free_ratio - свободные (в т.ч. придержанные),
+    cancelled_ratio - отмененные слоты, no_show_ratio - неявки среди записей с исходом.
+    """
+    queryset = DailyUtilization.objects.filter(date__range=(date_from, date_to))
+    if doctor_ids:
+        queryset = queryset.filter(doctor_id__in=doctor_ids)
+    if specialty_id:
+        queryset = queryset.filter(specialty_id=specialty_id)
+
+    fields = [field for group in group_by for field in GROUPS[group]]
+    rows = queryset.values(*fields).annotate(**{field: Sum(field) for field in COUNT_FIELDS}).order_by(*fields)
+
+    result = []
+    for row in rows:
+        item = {}
+        for field in fields:
+            if field == 'doctor__user__first_name':
+                item['doctor_name'] = f"{row[field]} {row['doctor__user__last_name']}".strip()
+            elif field == 'specialty__name':
+                item['specialty_name'] = row[field]
+            elif field != 'doctor__user__last_name':
+                item[field] = row[field]
+        item.update((field, row[field]) for field in COUNT_FIELDS)
+        item.update(
+            booked_ratio=_ratio(row['booked'] + row['completed'], row['slots']),
+            free_ratio=_ratio(row['free'] + row['held'], row['slots']),
+            cancelled_ratio=_ratio(row['cancelled'], row['slots']),
+            no_show_ratio=_ratio(row['no_show'], row['attended'] + row['no_show']),
+        )
+        result.append(item)
+    return result
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        # Подключаем сигналы сброса кеша пользователей и справочников
+        from . import authentication, catalog  # noqa: F401
@@ -0,0 +1,157 @@
+"""
+Аутентификация без лишних запросов к БД.
+
+CachedModelBackend кеширует поля пользователя (без хеша пароля) вместе с профилем
+пациента/врача, поэтому запрос с сессией (SESSION_ENGINE = cached_db) обходится без
+обращений к django_session и auth_user. Кеш нужен общий для всех процессов (Redis,
+Memcached): с локальным кешем процесса пользователь читается из БД. SignedTokenAuthentication - подписанный токен для
+API-клиентов, который не использует таблицу сессий вовсе.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core import signing
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import router
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+from rest_framework import authentication, exceptions
+
+from .models import Patient, Doctor
+
+User = get_user_model()
+
+TOKEN_SALT = 'api.authentication.token'
+TOKEN_KEYWORD = 'Bearer'
+
+
+PROFILES = (('patient_profile', Patient), ('doctor_profile', Doctor))
+
+
+def _user_cache():
+    """
+    Кеш пользователей или None, если кешировать нельзя. Сигналы сбрасывают запись только в кеше
+    своего процесса, поэтому локальный LocMemCache при нескольких процессах оставил бы у соседей
+    старые is_active/is_staff и пароль на весь AUTH_USER_CACHE_TTL. Он допускается только явно
+    (AUTH_USER_CACHE_LOCAL) для развертывания в один процесс.
+    """
+    user_cache = caches[getattr(settings, 'AUTH_USER_CACHE_ALIAS', DEFAULT_CACHE_ALIAS)]
+    if isinstance(user_cache, LocMemCache) and not getattr(settings, 'AUTH_USER_CACHE_LOCAL', False):
+        return None
+    return user_cache
+
+
+def _user_cache_key(user_id):
+    return f'auth_user:{user_id}'
+
+
+def _fields(instance, exclude=()):
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields if field.attname not in exclude
+    }
+
+
+def _restore(model, values):
+    # Поля, которых нет в кеше, становятся отложенными и дочитываются из БД при обращении
+    return model.from_db(router.db_for_read(model), list(values), list(values.values()))
+
+
+def _to_cache(user):
+    # Хеш пароля в кеш не попадает: вместо него хранится производный от него хеш сессии
+    data = {'user': _fields(user, exclude=('password',)), 'auth_hash': user.get_session_auth_hash()}
+    for name, model in PROFILES:
+        profile = getattr(user, name, None)
+        data[name] = _fields(profile) if profile is not None else None
+    return data
+
+
+def _from_cache(data):
+    user = _restore(User, data['user'])
+    auth_hash = data['auth_hash']
+    user.get_session_auth_hash = lambda: auth_hash
+    for name, model in PROFILES:
+        if data[name] is None:
+            # Отсутствие профиля тоже запоминается, hasattr() не пойдет в БД
+            getattr(User, name).related.set_cached_value(user, None)
+        else:
+            setattr(user, name, _restore(model, data[name]))
+    return user
+
+
+def _load_user(user_id):
+    return User.objects.select_related(*(name for name, _ in PROFILES)).filter(pk=user_id).first()
+
+
+def get_cached_user(user_id):
+    user_cache = _user_cache()
+    if user_cache is None:
+        return _load_user(user_id)
+    key = _user_cache_key(user_id)
+    data = user_cache.get(key)
+    if data is not None:
+        return _from_cache(data)
+    user = _load_user(user_id)
+    if user is not None:
+        user_cache.set(key, _to_cache(user), getattr(settings, 'AUTH_USER_CACHE_TTL', 60))
+    return user
+
+
+def invalidate_user_cache(user_id):
+    user_cache = _user_cache()
+    if user_cache is not None:
+        user_cache.delete(_user_cache_key(user_id))
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    invalidate_user_cache(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Patient)
+@receiver([post_save, post_delete], sender=Doctor)
+def invalidate_profile_user(sender, instance, **kwargs):
+    invalidate_user_cache(instance.user_id)
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+
+def _token_hash(user):
+    # Смена пароля меняет хеш сессии и делает старые токены недействительными
+    return user.get_session_auth_hash()[:16]
+
+
+def make_token(user):
+    return signing.dumps({'uid': user.pk, 'h': _token_hash(user)}, salt=TOKEN_SALT, compress=True)
+
+
+class SignedTokenAuthentication(authentication.BaseAuthentication):
+    """Заголовок "Authorization: Bearer <token>", токен выдает POST /api/token/."""
+
+    def authenticate(self, request):
+        header = authentication.get_authorization_header(request).split()
+        if not header or header[0].lower() != TOKEN_KEYWORD.lower().encode():
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+        try:
+            payload = signing.loads(
+                header[1].decode(), salt=TOKEN_SALT, max_age=getattr(settings, 'API_TOKEN_MAX_AGE', 24 * 60 * 60)
+            )
+        except (signing.BadSignature, UnicodeDecodeError):
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+
+        user = get_cached_user(payload.get('uid'))
+        if user is None or not user.is_active or not constant_time_compare(payload.get('h', ''), _token_hash(user)):
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+        return user, None
+
+    def authenticate_header(self, request):
+        return TOKEN_KEYWORD
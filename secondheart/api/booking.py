@@ -0,0 +1,45 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ScheduleSlot, Appointment
+from . import agenda, counters
+
+
+def book_next_available(patient, date_from, date_to, doctor_ids=None, specialty_id=None,
+                        time_from=None, time_to=None):
+    """
+    Записывает пациента на самый ранний свободный слот у врачей `doctor_ids` и/или
+    специальности `specialty_id` в окне дат [date_from, date_to] и времени начала [time_from, time_to).
+    Возвращает Appointment или None, если свободных слотов нет.
+
+    Слот выбирается и занимается в одной транзакции через FOR UPDATE SKIP LOCKED:
+    параллельные запросы не ждут друг друга и не конфликтуют, а берут следующий слот.
+    """
+    now = timezone.localtime()
+    slots = ScheduleSlot.objects.filter(
+        status='free', doctor__is_active=True, date__gte=max(date_from, now.date()), date__lte=date_to,
+    ).exclude(date=now.date(), start_time__lte=now.time())
+    if doctor_ids:
+        slots = slots.filter(doctor_id__in=doctor_ids)
+    if specialty_id:
+        slots = slots.filter(doctor__specialty_id=specialty_id)
+    if time_from:
+        slots = slots.filter(start_time__gte=time_from)
+    if time_to:
+        slots = slots.filter(start_time__lt=time_to)
+
+    with transaction.atomic():
+        # of=('self',) - блокируем только слот, а не строки врачей из JOIN
+        slot = (
+            slots.select_for_update(skip_locked=True, of=('self',))
+            .order_by('date', 'start_time', 'id')
+            .first()
+        )
+        if slot is None:
+            return None
+        slot.status = 'booked'
+        slot.save(update_fields=['status'])
+        appointment = Appointment.objects.create(patient=patient, slot=slot)
+        agenda.sync_slot(slot, appointment)
+        counters.move(slot.doctor_id, slot.date, 'free', 'booked')
+    return appointment
@@ -0,0 +1,43 @@
+"""
+Начальные данные страницы dashboard одним пакетом по роли пользователя.
+
+Отдаются через GET /api/bootstrap/ и встраиваются в HTML dashboard_view, чтобы страница
+не делала при загрузке отдельные запросы к /api/me/, /api/appointments/, /api/specialties/ и т.д.
+Число SQL-запросов фиксировано: справочники берутся из кеша (api/catalog.py),
+данные пользователя - одним запросом на раздел.
+"""
+from .models import Appointment, AgendaEntry, WorkingHours
+from . import catalog, serializers
+
+
+def user_info(user):
+    """То же, что отдает /api/me/."""
+    data = {'id': user.id, 'username': user.username, 'role': None, 'profile_id': None}
+    if hasattr(user, 'patient_profile'):
+        data['role'] = 'patient'
+        data['profile_id'] = user.patient_profile.id
+    elif hasattr(user, 'doctor_profile'):
+        data['role'] = 'doctor'
+        data['profile_id'] = user.doctor_profile.id
+    return data
+
+
+def bootstrap_data(user):
+    data = {'me': user_info(user)}
+    role = data['me']['role']
+
+    if role == 'patient':
+        appointments = (
+            Appointment.objects.filter(patient_id=data['me']['profile_id'])
+            .select_related('patient__user', 'slot__doctor__user', 'slot__doctor__specialty')
+            .order_by('-slot__date', '-slot__start_time')
+        )
+        data['appointments'] = serializers.AppointmentSerializer(appointments, many=True).data
+        data['specialties'] = catalog.get_specialties()
+        data['doctors'] = catalog.get_doctors()
+    elif role == 'doctor':
+        agenda = AgendaEntry.objects.filter(doctor_id=data['me']['profile_id']).order_by('date', 'start_time')
+        data['agenda'] = serializers.AgendaEntrySerializer(agenda, many=True).data
+        working_hours = WorkingHours.objects.filter(doctor_id=data['me']['profile_id']).order_by('day_of_week')
+        data['working_hours'] = serializers.WorkingHoursSerializer(working_hours, many=True).data
+    return data
@@ -0,0 +1,78 @@
+"""
+Кешированные справочники специальностей и врачей.
+
+Справочники меняются редко, а нужны почти каждой странице, поэтому сериализованные
+списки хранятся в кеше и сбрасываются сигналами после фиксации транзакции. Сброс должен
+дойти до всех процессов, в том числе после импорта в воркере, поэтому с локальным кешем
+процесса (LocMemCache) справочники не кешируются, если это не разрешено CATALOG_CACHE_LOCAL.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Specialty, Doctor
+from .serializers import SpecialtySerializer, DoctorSerializer
+
+User = get_user_model()
+
+SPECIALTIES_KEY = 'catalog:specialties'
+DOCTORS_KEY = 'catalog:doctors'
+
+
+def _enabled():
+    return not getattr(settings, 'LOCAL_CACHE', False) or getattr(settings, 'CATALOG_CACHE_LOCAL', False)
+
+
+def _cached(key, build):
+    if not _enabled():
+        return build()
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, getattr(settings, 'CATALOG_CACHE_TTL', 300))
+    return data
+
+
+def get_specialties():
+    """Список специальностей в формате SpecialtySerializer."""
+    return _cached(SPECIALTIES_KEY, lambda: [
+        dict(row) for row in SpecialtySerializer(Specialty.objects.order_by('id'), many=True).data
+    ])
+
+
+def get_doctors():
+    """Список врачей в формате DoctorSerializer (вместе с пользователем и специальностью)."""
+    def build():
+        doctors = Doctor.objects.select_related('user', 'specialty').order_by('id')
+        return [
+            {**row, 'user': dict(row['user']), 'specialty_details': dict(row['specialty_details'])}
+            for row in DoctorSerializer(doctors, many=True).data
+        ]
+    return _cached(DOCTORS_KEY, build)
+
+
+def invalidate(*keys):
+    if _enabled():
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+@receiver([post_save, post_delete], sender=Specialty)
+def invalidate_specialties(sender, **kwargs):
+    # Название специальности есть и в списке врачей
+    invalidate(SPECIALTIES_KEY, DOCTORS_KEY)
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+def invalidate_doctors(sender, **kwargs):
+    invalidate(DOCTORS_KEY)
+
+
+@receiver(post_save, sender=User)
+def invalidate_doctor_user(sender, instance, update_fields=None, **kwargs):
+    # Вход пользователя обновляет только last_login - имена врачей от этого не меняются
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate(DOCTORS_KEY)
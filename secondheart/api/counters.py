@@ -0,0 +1,107 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .models import DailySlotCounter, ScheduleSlot
+
+# Статусы слота, для которых ведется отдельный счетчик
+COUNTED_STATUSES = ('free', 'booked')
+
+
+def _ensure_rows(keys):
+    DailySlotCounter.objects.bulk_create(
+        [DailySlotCounter(doctor_id=doctor_id, date=day) for doctor_id, day in keys],
+        ignore_conflicts=True,
+    )
+
+
+def _apply(deltas):
+    """deltas: {(doctor_id, date): {'free': n, 'booked': n, 'total': n}}"""
+    _ensure_rows(deltas.keys())
+    for (doctor_id, day), delta in deltas.items():
+        changes = {field: F(field) + n for field, n in delta.items() if n}
+        if changes:
+            DailySlotCounter.objects.filter(doctor_id=doctor_id, date=day).update(changed_at=Now(), **changes)
+
+
+def add_slots(slots, sign=1):
+    """Учитывает созданные (sign=1) или удаленные (sign=-1) слоты."""
+    deltas = {}
+    for slot in slots:
+        delta = deltas.setdefault((slot.doctor_id, slot.date), Counter())
+        delta['total'] += sign
+        if slot.status in COUNTED_STATUSES:
+            delta[slot.status] += sign
+    _apply(deltas)
+
+
+def remove_slots(slots):
+    add_slots(slots, sign=-1)
+
+
+def move(doctor_id, day, old_status, new_status, count=1):
+    """Переносит `count` слотов дня из одного статуса в другой."""
+    if old_status == new_status:
+        return
+    delta = Counter()
+    if old_status in COUNTED_STATUSES:
+        delta[old_status] -= count
+    if new_status in COUNTED_STATUSES:
+        delta[new_status] += count
+    if delta:
+        _apply({(doctor_id, day): delta})
+    else:
+        touch(doctor_id, day)
+
+
+def touch(doctor_id, day):
+    """Отмечает день измененным без изменения счетчиков (например, сменился статус записи)."""
+    _ensure_rows([(doctor_id, day)])
+    DailySlotCounter.objects.filter(doctor_id=doctor_id, date=day).update(changed_at=Now())
+
+
+def _slot_counts(slots):
+    rows = slots.values('doctor_id', 'date').annotate(
+        free=Count('id', filter=Q(status='free')),
+        booked=Count('id', filter=Q(status='booked')),
+        total=Count('id'),
+    ).order_by()
+    return {(row['doctor_id'], row['date']): (row['free'], row['booked'], row['total']) for row in rows}
+
+
+def rebuild(doctor_ids=None, date_from=None, date_to=None):
+    """
+    Пересчитывает счетчики по таблице слотов на месте и возвращает число исправленных строк.
+    Строки счетчиков блокируются до конца транзакции, а слоты считаются уже после блокировки:
+    параллельное изменение либо попало в подсчет, либо применит свой F()-сдвиг поверх него.
+    changed_at обновляется только у исправленных строк; строки дней без слотов обнуляются, а не удаляются.
+    """
+    slots = ScheduleSlot.objects.all()
+    counters = DailySlotCounter.objects.all()
+    if doctor_ids:
+        slots = slots.filter(doctor_id__in=doctor_ids)
+        counters = counters.filter(doctor_id__in=doctor_ids)
+    if date_from:
+        slots = slots.filter(date__gte=date_from)
+        counters = counters.filter(date__gte=date_from)
+    if date_to:
+        slots = slots.filter(date__lte=date_to)
+        counters = counters.filter(date__lte=date_to)
+
+    with transaction.atomic():
+        _ensure_rows(_slot_counts(slots).keys())
+        locked = list(counters.select_for_update().order_by('doctor_id', 'date'))
+        actual = _slot_counts(slots)
+
+        fixed = []
+        now = timezone.now()
+        for counter in locked:
+            free, booked, total = actual.get((counter.doctor_id, counter.date), (0, 0, 0))
+            if (counter.free, counter.booked, counter.total) != (free, booked, total):
+                counter.free, counter.booked, counter.total, counter.changed_at = free, booked, total, now
+                fixed.append(counter)
+        DailySlotCounter.objects.bulk_update(fixed, ['free', 'booked', 'total', 'changed_at'], batch_size=1000)
+    return len(fixed)
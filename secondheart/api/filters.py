@@ -0,0 +1,33 @@
+import django_filters
+from .models import ScheduleSlot
+
+
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    pass
+
+
+class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    pass
+
+
+class ScheduleSlotFilter(django_filters.FilterSet):
+    """
+    Фильтры /api/slots/. Пример запроса - свободные слоты на неделю у врачей 3, 7 и 9 с 08:00 до 12:00:
+    /api/slots/?status=free&doctor__in=3,7,9&date_from=2025-12-01&date_to=2025-12-07
+        &start_time_from=08:00&start_time_to=12:00
+    Условия по врачу, дате и времени ложатся на индексы (doctor, date, start_time).
+    """
+    doctor__in = NumberInFilter(field_name='doctor', lookup_expr='in')
+    specialty = django_filters.NumberFilter(field_name='doctor__specialty')
+    date_from = django_filters.DateFilter(field_name='date', lookup_expr='gte')
+    date_to = django_filters.DateFilter(field_name='date', lookup_expr='lte')
+    start_time_from = django_filters.TimeFilter(field_name='start_time', lookup_expr='gte')
+    start_time_to = django_filters.TimeFilter(field_name='start_time', lookup_expr='lt')
+    # ISO: 1 - понедельник, 7 - воскресенье (как WorkingHours.day_of_week)
+    weekday = NumberInFilter(field_name='date', lookup_expr='iso_week_day__in')
+    status__in = CharInFilter(field_name='status', lookup_expr='in')
+    ordering = django_filters.OrderingFilter(fields=('date', 'start_time', 'doctor'))
+
+    class Meta:
+        model = ScheduleSlot
+        fields = ['doctor', 'date', 'status']
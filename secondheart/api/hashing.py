@@ -0,0 +1,21 @@
+"""
+Пул процессов для хеширования паролей при массовом импорте (api/people_import.py).
+
+Процессы пула запускаются через spawn и загружают этот модуль до настройки Django,
+поэтому здесь нельзя импортировать модели.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def make_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_worker
+    )
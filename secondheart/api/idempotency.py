@@ -0,0 +1,170 @@
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+
+def _ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+
+
+def _wait_timeout():
+    return getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)
+
+
+def _lease():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_PROCESSING_LEASE', 120))
+
+
+def _scope(request):
+    if request.user and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return 'anon'
+
+
+def _request_hash(request):
+    payload = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha256(f'{request.method} {request.path}\n{payload}'.encode()).hexdigest()
+
+
+def _cache_key(scope, key):
+    return 'idem:' + hashlib.sha256(f'{scope}:{key}'.encode()).hexdigest()
+
+
+def _replay(stored, request_hash):
+    if stored['request_hash'] != request_hash:
+        return Response(
+            {"detail": "Idempotency-Key was already used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    return Response(stored['body'], status=stored['code'], headers={REPLAY_HEADER: 'true'})
+
+
+def _claim(scope, key, request_hash):
+    """
+    Пытается занять ключ. Возвращает (None, started_at), если ключ наш и запрос нужно выполнить
+    (started_at отличает нашу аренду от перехватившего ее повтора), иначе - (ответ, None):
+    сохраненный ответ первого запроса или 409, если он не успел завершиться.
+    """
+    deadline = time.monotonic() + _wait_timeout()
+    delay = 0.05
+    while True:
+        stored = cache.get(_cache_key(scope, key))
+        if stored is not None:
+            return _replay(stored, request_hash), None
+
+        now = timezone.now()
+        try:
+            # Вне транзакции запроса: вставка сразу видна параллельным повторам
+            # (atomic - только savepoint на случай, если вызывающий код уже в транзакции)
+            with transaction.atomic():
+                IdempotencyKey.objects.create(
+                    scope=scope, key=key, request_hash=request_hash, processing_started_at=now,
+                    expires_at=now + timedelta(seconds=_ttl())
+                )
+            return None, now
+        except IntegrityError:
+            pass
+
+        record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if record is None:
+            continue
+        if record.expires_at <= now:
+            record.delete()
+            continue
+        if record.status == 'processing' and record.processing_started_at <= now - _lease():
+            # Процесс, занявший ключ, умер, не успев ни сохранить ответ, ни освободить ключ.
+            # Условный UPDATE: из нескольких повторов аренду перехватит только один
+            taken = IdempotencyKey.objects.filter(
+                pk=record.pk, status='processing', processing_started_at=record.processing_started_at
+            ).update(request_hash=request_hash, processing_started_at=now)
+            if taken:
+                return None, now
+            continue
+        if record.status == 'done':
+            stored = {'request_hash': record.request_hash, 'code': record.response_code,
+                      'body': record.response_body}
+            cache.set(_cache_key(scope, key), stored, _ttl())
+            return _replay(stored, request_hash), None
+
+        # Первый запрос с этим ключом еще выполняется - ждем его результата, а не гоняемся с ним
+        if time.monotonic() >= deadline:
+            return Response(
+                {"detail": "A request with this Idempotency-Key is still being processed."},
+                status=status.HTTP_409_CONFLICT
+            ), None
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def _own(scope, key, started_at):
+    """Наша запись ключа - если аренду не перехватил повтор, пока запрос выполнялся."""
+    return IdempotencyKey.objects.filter(scope=scope, key=key, status='processing', processing_started_at=started_at)
+
+
+def _store(scope, key, started_at, request_hash, response):
+    body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+    if not _own(scope, key, started_at).update(status='done', response_code=response.status_code, response_body=body):
+        return
+    cache.set(_cache_key(scope, key), {'request_hash': request_hash, 'code': response.status_code, 'body': body},
+              _ttl())
+
+
+def idempotent(view_method):
+    """
+    Декоратор для POST-методов viewset'ов: поддержка заголовка Idempotency-Key.
+    Первый ответ (кроме 5xx) сохраняется и отдается повторам с тем же ключом;
+    параллельный повтор ждет завершения первого запроса, а ключ, занятый дольше
+    IDEMPOTENCY_PROCESSING_LEASE (процесс убит посреди запроса), перехватывает.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"detail": "Idempotency-Key is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        scope = _scope(request)
+        request_hash = _request_hash(request)
+        response, started_at = _claim(scope, key, request_hash)
+        if response is not None:
+            return response
+
+        try:
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except APIException as exc:
+                response = self.handle_exception(exc)
+        except BaseException:
+            _own(scope, key, started_at).delete()
+            raise
+
+        if response.status_code >= 500:
+            # Ошибку сервера не запоминаем - повтор должен выполниться заново
+            _own(scope, key, started_at).delete()
+        else:
+            _store(scope, key, started_at, request_hash, response)
+        return response
+
+    return wrapper
+
+
+def purge_expired():
+    return IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()[0]
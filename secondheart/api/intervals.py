@@ -0,0 +1,77 @@
+"""
+Операции над интервалами времени внутри дня.
+
+Интервал - пара (start, end) в минутах от полуночи, end не включается.
+Функции принимают произвольные списки интервалов и возвращают нормализованные:
+отсортированные по началу, без пересечений и без пустых интервалов.
+Нормализация стоит O(n log n), остальные операции над нормализованными списками - O(n + m).
+"""
+from datetime import time
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def to_time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+def normalize(intervals):
+    """Сортирует интервалы и сливает пересекающиеся и смежные."""
+    result = []
+    for start, end in sorted(i for i in intervals if i[0] < i[1]):
+        if result and start <= result[-1][1]:
+            if end > result[-1][1]:
+                result[-1] = (result[-1][0], end)
+        else:
+            result.append((start, end))
+    return result
+
+
+def find_overlaps(intervals):
+    """Возвращает пары пересекающихся интервалов (смежные не считаются пересечением)."""
+    overlaps = []
+    ordered = sorted(intervals)
+    # Интервал с максимальным концом среди уже просмотренных
+    latest = None
+    for interval in ordered:
+        if latest is not None and interval[0] < latest[1]:
+            overlaps.append((latest, interval))
+        if latest is None or interval[1] > latest[1]:
+            latest = interval
+    return overlaps
+
+
+def union(first, second):
+    return normalize(list(first) + list(second))
+
+
+def subtract(base, cuts):
+    """Вычитает из нормализованного списка `base` нормализованный список `cuts` за один проход."""
+    result = []
+    j = 0
+    for start, end in base:
+        # Пропускаем вырезы, которые закончились до начала интервала
+        while j < len(cuts) and cuts[j][1] <= start:
+            j += 1
+        k = j
+        while k < len(cuts) and cuts[k][0] < end:
+            cut_start, cut_end = cuts[k]
+            if cut_start > start:
+                result.append((start, cut_start))
+            start = max(start, cut_end)
+            if start >= end:
+                break
+            k += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def split(intervals, length):
+    """Нарезает интервалы на отрезки длиной `length` минут; хвост короче `length` отбрасывается."""
+    for start, end in intervals:
+        while start + length <= end:
+            yield start, start + length
+            start += length
@@ -0,0 +1,151 @@
+import logging
+import threading
+from datetime import date, timedelta
+
+from django.db import connection, transaction, DatabaseError
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Doctor, Job
+from .scheduling import generate_doctor_slots
+from . import lifecycle, people_import
+
+logger = logging.getLogger(__name__)
+
+# kind -> функция handler(job), возвращающая dict с результатом
+HANDLERS = {}
+
+# Воркер продлевает аренду задачи каждые HEARTBEAT_INTERVAL секунд; задача, аренда которой
+# не продлевалась дольше LEASE, считается брошенной (воркер упал) и возвращается в очередь
+HEARTBEAT_INTERVAL = 15
+LEASE = timedelta(minutes=2)
+
+
+def handler(kind):
+    """Регистрирует обработчик задач вида `kind`."""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, params=None, user=None, total=0):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return Job.objects.create(kind=kind, params=params or {}, created_by=user, total=total)
+
+
+def claim_job(kinds=None):
+    """
+    Забирает самую старую задачу из очереди. SKIP LOCKED позволяет нескольким
+    воркерам разбирать очередь параллельно, не блокируя друг друга на одной строке.
+    """
+    with transaction.atomic():
+        queryset = Job.objects.select_for_update(skip_locked=True).filter(status='queued')
+        if kinds:
+            queryset = queryset.filter(kind__in=kinds)
+        job = queryset.order_by('created_at').first()
+        if job is None:
+            return None
+        job.status = 'running'
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'attempts'])
+    return job
+
+
+def set_progress(job, progress, result=None):
+    job.progress = progress
+    fields = ['progress']
+    if result is not None:
+        job.result = result
+        fields.append('result')
+    job.save(update_fields=fields)
+
+
+class Heartbeat(threading.Thread):
+    """Продлевает аренду задачи в отдельном потоке (со своим соединением с БД), пока работает обработчик."""
+
+    def __init__(self, job_id, interval=HEARTBEAT_INTERVAL):
+        super().__init__(name=f'job-heartbeat-{job_id}', daemon=True)
+        self.job_id = job_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    Job.objects.filter(pk=self.job_id, status='running').update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    # Пропущенное продление не страшно, если следующее успеет до истечения аренды
+                    logger.warning("Job %s heartbeat failed", self.job_id, exc_info=True)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job):
+    heartbeat = Heartbeat(job.pk)
+    heartbeat.start()
+    try:
+        job.result = HANDLERS[job.kind](job) or {}
+        job.status = 'done'
+    except Exception as e:
+        logger.exception("Job %s failed", job.pk)
+        job.status = 'failed'
+        job.error = str(e)
+    finally:
+        heartbeat.stop()
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'status', 'error', 'finished_at'])
+    return job
+
+
+def requeue_stale(older_than=LEASE):
+    """
+    Возвращает в очередь задачи, аренда которых не продлевалась дольше `older_than` (воркер упал).
+    Задачи живых воркеров не трогает, сколько бы они ни выполнялись.
+    """
+    cutoff = timezone.now() - older_than
+    return Job.objects.filter(status='running').filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    ).update(status='queued')
+
+
+# --- Обработчики ---
+
+@handler('generate_schedule')
+def generate_schedule_job(job):
+    doctor = Doctor.objects.get(pk=job.params['doctor_id'])
+    start_date = date.fromisoformat(job.params['start_date'])
+
+    def on_day(done, created):
+        set_progress(job, done, {'created': created})
+
+    created = generate_doctor_slots(doctor, start_date, job.params['days'], on_day=on_day)
+    return {'created': created}
+
+
+@handler('import_people')
+def import_people_job(job):
+    def on_chunk(report):
+        set_progress(job, report.rows, {'created': report.created, 'failed': len(report.errors)})
+
+    report = people_import.import_upload(
+        job.params['file'], job.params['role'], job.params['format'], on_chunk=on_chunk
+    )
+    return report.as_dict()
+
+
+@handler('sweep_appointments')
+def sweep_appointments_job(job):
+    rules = lifecycle.get_rules(job.params.get('outcome'), job.params.get('grace_minutes'))
+
+    def on_batch(batches, totals):
+        set_progress(job, totals['slots'], dict(totals))
+
+    return lifecycle.sweep(rules=rules, batch_size=job.params.get('batch_size', 500), on_batch=on_batch)
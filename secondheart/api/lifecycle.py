@@ -0,0 +1,158 @@
+"""
+Перевод прошедших приемов в итоговые статусы.
+
+sweep() находит занятые слоты, прием в которых закончился раньше, чем grace_minutes назад, и пачками
+переводит их в completed, а записи в статусе scheduled - в итог правила (completed или no_show).
+Запись, которую врач уже отметил сам, сохраняет его статус. Каждая пачка - отдельная короткая
+транзакция с SKIP LOCKED, поэтому пачка не ждет строк, занятых API, и никого не задерживает.
+
+Пачки выбираются по частичному индексу занятых слотов slot_booked_date_time_idx, и прошедшие
+приемы из него уходят - индекс остается размером с будущее расписание. Отдельного частичного
+индекса по Appointment.status='scheduled' нет: запись читается по уникальному slot_id, а запросов,
+отбирающих записи только по этому статусу, в приложении нет. Неотправленные напоминания о
+прошедших приемах отменяются в той же пачке и уходят из частичного индекса очереди outbox.
+Итоги каждого прохода пишутся в Checkpoint 'lifecycle.sweep' для мониторинга.
+"""
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from . import counters
+from .models import AgendaEntry, Appointment, Checkpoint, ReminderOutbox, ScheduleSlot
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = 'lifecycle.sweep'
+OUTCOMES = ('completed', 'no_show')
+DEFAULT_RULES = [{'outcome': 'completed', 'grace_minutes': 120}]
+RESULT_FIELDS = ('slots', 'completed', 'no_show', 'reminders_cancelled')
+
+
+def get_rules(outcome=None, grace_minutes=None):
+    """
+    Правила из settings.SWEEP_RULES. Правило со `specialty` действует для врачей этой специальности,
+    правило без нее - для остальных. outcome/grace_minutes заменяют значения в общем правиле.
+    """
+    rules = [dict(rule) for rule in getattr(settings, 'SWEEP_RULES', DEFAULT_RULES)]
+    if not any(rule.get('specialty') is None for rule in rules):
+        rules.append(dict(DEFAULT_RULES[0]))
+    for rule in rules:
+        if rule.get('specialty') is None:
+            if outcome is not None:
+                rule['outcome'] = outcome
+            if grace_minutes is not None:
+                rule['grace_minutes'] = grace_minutes
+        if rule['outcome'] not in OUTCOMES:
+            raise ValueError(f"Unknown sweep outcome: {rule['outcome']}")
+        if rule['grace_minutes'] < 0:
+            raise ValueError("grace_minutes must not be negative")
+    return rules
+
+
+def _ended_not_after(moment):
+    return Q(date__lt=moment.date()) | Q(date=moment.date(), end_time__lte=moment.time())
+
+
+def _rule_queryset(rule, rules, now):
+    cutoff = now - timedelta(minutes=rule['grace_minutes'])
+    queryset = ScheduleSlot.objects.filter(status='booked', date__lte=cutoff.date()).filter(_ended_not_after(cutoff))
+    if rule.get('specialty') is not None:
+        return queryset.filter(doctor__specialty_id=rule['specialty'])
+    own = [other['specialty'] for other in rules if other.get('specialty') is not None]
+    if own:
+        queryset = queryset.exclude(doctor__specialty_id__in=own)
+    return queryset
+
+
+def sweep_batch(queryset, outcome, batch_size=500):
+    """
+    Обрабатывает одну пачку слотов из `queryset`. Возвращает счетчики пачки
+    (slots = 0 - обрабатывать больше нечего).
+    """
+    result = dict.fromkeys(RESULT_FIELDS, 0)
+    with transaction.atomic():
+        # Слот и его запись, занятые другой транзакцией (например, врач ставит статус), пропускаем -
+        # они попадут в следующий проход. Join к записи внутренний: FOR UPDATE не применяется
+        # к nullable-стороне LEFT JOIN
+        slots = list(
+            queryset.filter(appointment__isnull=False)
+            .select_for_update(skip_locked=True, of=('self', 'appointment'))
+            .select_related('appointment')
+            .only('id', 'doctor_id', 'date', 'appointment__id', 'appointment__status')
+            .order_by('date', 'start_time')[:batch_size]
+        )
+        if not slots:
+            return result
+        slot_ids = [slot.id for slot in slots]
+        appointment_ids = [slot.appointment.id for slot in slots]
+        scheduled = [slot.appointment.id for slot in slots if slot.appointment.status == 'scheduled']
+        result['slots'] = len(slots)
+        result[outcome] = len(scheduled)
+
+        Appointment.objects.filter(id__in=scheduled).update(status=outcome, updated_at=Now())
+        ScheduleSlot.objects.filter(id__in=slot_ids).update(status='completed')
+        AgendaEntry.objects.filter(slot_id__in=slot_ids).update(status='completed')
+        result['reminders_cancelled'] = ReminderOutbox.objects.filter(
+            appointment_id__in=appointment_ids, status='pending'
+        ).update(status='cancelled')
+        for (doctor_id, day), count in sorted(Counter((slot.doctor_id, slot.date) for slot in slots).items()):
+            counters.move(doctor_id, day, 'booked', 'completed', count)
+    return result
+
+
+def sweep(now=None, rules=None, batch_size=500, pause=0.0, max_batches=None, dry_run=False, on_batch=None):
+    """
+    Переводит прошедшие приемы в итоговые статусы по правилам `rules` (по умолчанию get_rules()).
+    pause - пауза между пачками в секундах, max_batches - ограничение числа пачек за проход.
+    dry_run - только посчитать, сколько слотов и записей будет переведено.
+    Возвращает итоговые счетчики и пишет их в Checkpoint (кроме dry_run).
+    """
+    started = time.perf_counter()
+    # Слоты хранят локальные дату и время
+    now = now or timezone.localtime().replace(tzinfo=None)
+    rules = rules if rules is not None else get_rules()
+    totals = dict.fromkeys(RESULT_FIELDS, 0)
+    batches = 0
+
+    for rule in rules:
+        queryset = _rule_queryset(rule, rules, now)
+        if dry_run:
+            totals['slots'] += queryset.count()
+            totals[rule['outcome']] += queryset.filter(appointment__status='scheduled').count()
+            continue
+        while max_batches is None or batches < max_batches:
+            result = sweep_batch(queryset, rule['outcome'], batch_size)
+            if not result['slots']:
+                break
+            batches += 1
+            for field, value in result.items():
+                totals[field] += value
+            if on_batch:
+                on_batch(batches, totals)
+            if pause:
+                time.sleep(pause)
+
+    totals['batches'] = batches
+    totals['seconds'] = round(time.perf_counter() - started, 3)
+    if not dry_run:
+        _record(now, totals)
+    logger.info("Appointment sweep: %s", totals)
+    return totals
+
+
+def _record(now, totals):
+    with transaction.atomic():
+        checkpoint, _ = Checkpoint.objects.select_for_update().get_or_create(name=CHECKPOINT)
+        overall = checkpoint.value.get('totals', {})
+        checkpoint.value = {
+            'last_run': {'now': now.isoformat(), **totals},
+            'totals': {field: overall.get(field, 0) + totals[field] for field in RESULT_FIELDS},
+        }
+        checkpoint.save(update_fields=['value', 'updated_at'])
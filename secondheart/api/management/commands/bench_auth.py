@@ -0,0 +1,92 @@
+import time
+
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from api.authentication import invalidate_user_cache, make_token
+
+BENCH_CACHE_ALIAS = 'bench_auth'
+
+SCENARIOS = [
+    ('db session + ModelBackend', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+    }, False),
+    ('cached_db session + CachedModelBackend', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+        'AUTHENTICATION_BACKENDS': ['api.authentication.CachedModelBackend'],
+    }, False),
+    ('signed_cookies session + CachedModelBackend', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.signed_cookies',
+        'AUTHENTICATION_BACKENDS': ['api.authentication.CachedModelBackend'],
+    }, False),
+    ('Bearer token (no session)', {
+        'AUTHENTICATION_BACKENDS': ['api.authentication.CachedModelBackend'],
+    }, True),
+]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает число SQL-запросов и время на запрос для разных способов аутентификации'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Пользователь для запросов (по умолчанию - первый пациент)')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Проверяемый URL (можно указать несколько раз)')
+        parser.add_argument('--requests', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(patient_profile__isnull=False).first()
+        if user is None:
+            raise CommandError('Пользователь не найден')
+        paths = options['paths'] or ['/api/me/', '/api/slots/?status=free&date=1970-01-01']
+
+        # Свой алиас с префиксом ключей: бенчмарк не трогает чужие ключи общего кеша, а clear()
+        # на Redis/Memcached очистил бы его целиком. Команда работает одним процессом, поэтому
+        # кеш пользователей допустим и поверх LocMemCache
+        bench_cache = {
+            'CACHES': {
+                **settings.CACHES,
+                BENCH_CACHE_ALIAS: {**settings.CACHES['default'], 'KEY_PREFIX': BENCH_CACHE_ALIAS},
+            },
+            'SESSION_CACHE_ALIAS': BENCH_CACHE_ALIAS,
+            'AUTH_USER_CACHE_ALIAS': BENCH_CACHE_ALIAS,
+            'AUTH_USER_CACHE_LOCAL': True,
+        }
+
+        self.stdout.write(f"Пользователь: {user.username}, запросов на сценарий: {options['requests']}")
+        for title, overrides, use_token in SCENARIOS:
+            with override_settings(**bench_cache, **overrides):
+                invalidate_user_cache(user.pk)
+                client = Client(HTTP_HOST='localhost')
+                if use_token:
+                    client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {make_token(user)}'
+                else:
+                    client.force_login(user, backend=overrides['AUTHENTICATION_BACKENDS'][0])
+                try:
+                    self.run_scenario(client, title, paths, options['requests'])
+                finally:
+                    # Удаляет созданную force_login сессию из БД и кеша
+                    client.logout()
+                    invalidate_user_cache(user.pk)
+
+    def run_scenario(self, client, title, paths, requests):
+        self.stdout.write(f"\n{title}")
+        for path in paths:
+            client.get(path)  # прогрев кеша
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                for _ in range(requests):
+                    response = client.get(path)
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"  {path:<45} HTTP {response.status_code}  "
+                f"запросов к БД: {len(ctx) / requests:.1f}  "
+                f"время: {elapsed / requests * 1000:.2f} мс"
+            )
@@ -0,0 +1,46 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from api import reminders
+
+
+class Command(BaseCommand):
+    help = 'Отправляет напоминания из outbox пачками через транспорт settings.REMINDER_TRANSPORT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--max-attempts', type=int, default=5,
+                            help='После стольких неудачных попыток напоминание помечается failed')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Перед каждым проходом ставить в outbox новые напоминания')
+        parser.add_argument('--requeue-stale', type=int, metavar='SECONDS',
+                            help='Вернуть в очередь напоминания, зависшие в sending дольше SECONDS '
+                                 '(они могли уже уйти получателю)')
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно')
+        parser.add_argument('--interval', type=float, default=5.0, help='Пауза, когда очередь пуста, в секундах')
+
+    def handle(self, *args, **options):
+        if options['requeue_stale'] is not None:
+            requeued = reminders.requeue_stale(timedelta(seconds=options['requeue_stale']))
+            self.stdout.write(f"Возвращено в очередь зависших напоминаний: {requeued}")
+
+        transport = reminders.get_transport()
+        while True:
+            if options['schedule']:
+                reminders.schedule_reminders()
+            totals = {'sent': 0, 'retry': 0, 'failed': 0}
+            # Каждая пачка фиксируется отдельно: после перезапуска отправленное не повторяется
+            while True:
+                result = reminders.dispatch_batch(transport, options['batch_size'], options['max_attempts'])
+                if result is None:
+                    break
+                for key, value in result.items():
+                    totals[key] += value
+            if any(totals.values()):
+                self.stdout.write(f"Отправлено: {totals['sent']}, на повтор: {totals['retry']}, "
+                                  f"с ошибкой: {totals['failed']}")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Готово'))
@@ -0,0 +1,48 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from api.people_import import import_people, ROLES, FORMATS, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт пациентов или врачей из CSV/NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с данными или "-" для stdin')
+        parser.add_argument('--role', choices=ROLES, required=True)
+        parser.add_argument('--format', choices=FORMATS, help='По умолчанию - по расширению файла')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--workers', type=int, help='Процессов для хеширования паролей (0 - без пула)')
+        parser.add_argument('--errors', help='Куда записать отчет об ошибках по строкам (NDJSON)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+
+        def on_chunk(report):
+            self.stdout.write(
+                f"Обработано строк: {report.rows}, создано: {report.created}, "
+                f"ошибок: {len(report.errors)} ({report.rows_per_second:.0f} строк/с)"
+            )
+
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        with stream:
+            report = import_people(stream, options['role'], fmt, options['chunk_size'], options['workers'],
+                                   on_chunk=on_chunk)
+
+        if options['errors'] and report.errors:
+            with open(options['errors'], 'w', encoding='utf-8') as f:
+                for error in report.errors:
+                    f.write(json.dumps(error, ensure_ascii=False) + '\n')
+
+        summary = report.as_dict()
+        summary.pop('errors')
+        self.stdout.write(self.style.SUCCESS(f"Импорт завершен: {summary}"))
+        for error in report.errors[:20]:
+            self.stdout.write(self.style.WARNING(f"  строка {error['row']}: {error['errors']}"))
+        if len(report.errors) > 20:
+            self.stdout.write(f"  ... и еще {len(report.errors) - 20} ошибок")
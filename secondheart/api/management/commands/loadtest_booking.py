@@ -0,0 +1,331 @@
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http.cookiejar import CookieJar
+from urllib import error, parse, request
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Q
+from api.models import Patient, ScheduleSlot, Appointment, AgendaEntry, DailySlotCounter
+
+
+class PatientClient:
+    """
+    HTTP-клиент одного пациента: своя cookie-сессия и CSRF-токен,
+    как у браузера, работающего с login_view и API.
+    """
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = request.build_opener(request.HTTPCookieProcessor(self.cookies))
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def call(self, method, path, data=None, json_body=None):
+        """Возвращает (код ответа, тело, длительность в секундах)."""
+        url = self.base_url + path
+        headers = {'Referer': self.base_url + '/'}
+        body = None
+        if data is not None:
+            body = parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        if method != 'GET':
+            headers['X-CSRFToken'] = self.csrf_token()
+
+        req = request.Request(url, data=body, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                payload = resp.read()
+                code = resp.status
+        except error.HTTPError as e:
+            payload = e.read()
+            code = e.code
+        except (error.URLError, TimeoutError, ConnectionError):
+            payload = b''
+            code = 0  # Сетевая ошибка / таймаут
+        return code, payload, time.perf_counter() - started
+
+    def login(self, username, password):
+        # Получаем csrftoken со страницы логина, затем отправляем форму
+        code, payload, elapsed = self.call('GET', '/login/')
+        if code != 200:
+            return code, elapsed
+        token = self.csrf_token()
+        if not token:
+            match = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', payload)
+            token = match.group(1).decode() if match else ''
+        code, _, post_elapsed = self.call('POST', '/login/', data={
+            'username': username,
+            'password': password,
+            'csrfmiddlewaretoken': token,
+        })
+        # При неверном пароле login_view снова отдает форму с кодом 200
+        if code == 200 and not self.has_session():
+            code = 401
+        return code, elapsed + post_elapsed
+
+    def has_session(self):
+        return any(cookie.name == 'sessionid' for cookie in self.cookies)
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.codes = {}
+
+    def add(self, name, code, elapsed):
+        with self.lock:
+            self.latencies.setdefault(name, []).append(elapsed)
+            codes = self.codes.setdefault(name, {})
+            codes[code] = codes.get(code, 0) + 1
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест записи на прием ("шторм бронирований") с проверкой целостности БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--patients', type=int, default=200, help='Количество симулируемых пациентов')
+        parser.add_argument('--concurrency', type=int, default=50, help='Количество параллельных потоков')
+        parser.add_argument('--attempts', type=int, default=3,
+                            help='Сколько попыток записи делает пациент, если слот уже заняли')
+        parser.add_argument('--doctor', type=int, help='Ограничить выбор слотов одним врачом')
+        parser.add_argument('--specialty', type=int, help='Ограничить выбор слотов одной специальностью')
+        parser.add_argument('--mode', choices=['pick', 'next'], default='pick',
+                            help='pick - клиент выбирает слот из списка, next - сервер выдает ближайший '
+                                 '(/api/appointments/next_available/)')
+        parser.add_argument('--days', type=int, default=14, help='Окно поиска слотов для --mode next, дней')
+        parser.add_argument('--sweep', help='Прогнать несколько уровней параллельности, например 1,2,4,8,16')
+        parser.add_argument('--password', default='loadtest-pass-123')
+        parser.add_argument('--username-prefix', default='loadtest_patient_')
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--check-only', action='store_true', help='Только проверить инварианты БД')
+
+    def handle(self, *args, **options):
+        if options['check_only']:
+            self.check_invariants()
+            return
+
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+
+        if options['mode'] == 'next' and not (options['doctor'] or options['specialty']):
+            raise CommandError('Для --mode next укажите --doctor или --specialty')
+
+        accounts = self.ensure_patients(options)
+
+        slots_path = '/api/slots/?status=free'
+        if options['doctor']:
+            slots_path += f"&doctor={options['doctor']}"
+        if options['specialty']:
+            slots_path += f"&specialty={options['specialty']}"
+        next_body = {'date_to': (date.today() + timedelta(days=options['days'])).isoformat()}
+        if options['doctor']:
+            next_body['doctors'] = [options['doctor']]
+        if options['specialty']:
+            next_body['specialty'] = options['specialty']
+
+        def login_patient(stats, account):
+            username, profile_id = account
+            client = PatientClient(options['base_url'], options['timeout'])
+
+            code, elapsed = client.login(username, options['password'])
+            # Успешный вход - редирект (302) на dashboard, который открывает opener
+            stats.add('login', code, elapsed)
+            return (client, profile_id) if code == 200 else None
+
+        def run_patient(stats, session):
+            client, profile_id = session
+            if options['mode'] == 'next':
+                # Одна попытка: сервер сам берет ближайший незанятый слот, 404 - слоты кончились
+                code, _, elapsed = client.call('POST', '/api/appointments/next_available/', json_body=next_body)
+                stats.add('book', code, elapsed)
+                return
+
+            for _ in range(options['attempts']):
+                code, payload, elapsed = client.call('GET', slots_path)
+                stats.add('list_free_slots', code, elapsed)
+                if code != 200:
+                    return
+                slots = json.loads(payload)
+                if not slots:
+                    return
+
+                slot = random.choice(slots)
+                code, _, elapsed = client.call('POST', '/api/appointments/', json_body={
+                    'patient': profile_id,
+                    'slot': slot['id'],
+                })
+                stats.add('book', code, elapsed)
+                if code == 201:
+                    return
+
+        levels = [int(level) for level in options['sweep'].split(',')] if options['sweep'] \
+            else [options['concurrency']]
+        summary = []
+        for level in levels:
+            self.stdout.write(
+                f"\nРежим: {options['mode']}, пациентов: {len(accounts)}, потоков: {level}, "
+                f"сервер: {options['base_url']}"
+            )
+            stats = Stats()
+            with ThreadPoolExecutor(max_workers=level) as pool:
+                # Вход (PBKDF2) не входит в замер, иначе он заслоняет саму запись
+                sessions = [s for s in pool.map(lambda account: login_patient(stats, account), accounts) if s]
+                started = time.perf_counter()
+                list(pool.map(lambda session: run_patient(stats, session), sessions))
+            duration = time.perf_counter() - started
+            self.report(stats, duration)
+            summary.append((level, stats, duration))
+
+        if len(summary) > 1:
+            # Без конфликтов число записей в секунду должно расти почти пропорционально потокам
+            self.stdout.write(f"\n{'потоков':>8}{'записей':>10}{'конфликтов':>12}{'записей/с':>12}{'p95 мс':>10}")
+            for level, stats, duration in summary:
+                codes = stats.codes.get('book', {})
+                self.stdout.write(
+                    f"{level:>8}{codes.get(201, 0):>10}{codes.get(400, 0):>12}"
+                    f"{codes.get(201, 0) / duration if duration else 0:>12.1f}"
+                    f"{percentile(stats.latencies.get('book', []), 95) * 1000:>10.1f}"
+                )
+        self.check_invariants()
+
+    def ensure_patients(self, options):
+        """Создает недостающих тестовых пациентов одним bulk_create с общим хешем пароля."""
+        prefix = options['username_prefix']
+        usernames = [f'{prefix}{i}' for i in range(options['patients'])]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+
+        missing = [name for name in usernames if name not in existing]
+        if missing:
+            password_hash = make_password(options['password'])
+            with transaction.atomic():
+                User.objects.bulk_create(
+                    [User(username=name, password=password_hash, first_name='Load', last_name=name)
+                     for name in missing]
+                )
+                users = User.objects.filter(username__in=missing, patient_profile__isnull=True)
+                Patient.objects.bulk_create([
+                    Patient(user=user, date_of_birth='1990-01-01', phone_number='+70000000000')
+                    for user in users
+                ])
+            self.stdout.write(f"Создано тестовых пациентов: {len(missing)}")
+
+        accounts = list(
+            Patient.objects.filter(user__username__in=usernames).values_list('user__username', 'id')
+        )
+        if not accounts:
+            raise CommandError('Нет тестовых пациентов')
+        return accounts
+
+    def report(self, stats, duration):
+        total = sum(len(v) for v in stats.latencies.values())
+        self.stdout.write(f"\nВремя: {duration:.2f} с, запросов: {total}, "
+                          f"пропускная способность: {total / duration if duration else 0:.1f} req/s")
+
+        header = f"{'операция':<16}{'кол-во':>8}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'ср. мс':>10}{'ошибки':>9}"
+        self.stdout.write(header)
+        for name, values in stats.latencies.items():
+            codes = stats.codes[name]
+            # Для записи 400 - ожидаемый проигрыш гонки за слот, 404 - слотов в окне не осталось
+            ok_codes = {200, 201} | ({400, 404} if name == 'book' else set())
+            failed = sum(n for code, n in codes.items() if code not in ok_codes)
+            self.stdout.write(
+                f"{name:<16}{len(values):>8}"
+                f"{percentile(values, 50) * 1000:>10.1f}"
+                f"{percentile(values, 95) * 1000:>10.1f}"
+                f"{percentile(values, 99) * 1000:>10.1f}"
+                f"{statistics.mean(values) * 1000:>10.1f}"
+                f"{failed / len(values):>8.1%}"
+            )
+            self.stdout.write(f"{'':<16}коды ответов: {dict(sorted(codes.items()))}")
+
+        booked = stats.codes.get('book', {}).get(201, 0)
+        conflicts = stats.codes.get('book', {}).get(400, 0)
+        self.stdout.write(f"\nУспешных записей: {booked}, конфликтов (слот уже занят): {conflicts}")
+
+    def check_invariants(self):
+        self.stdout.write("\nПроверка инвариантов БД:")
+        problems = 0
+
+        # Две записи на слот невозможны (OneToOneField) - проверяем согласованность статусов и read-моделей
+        orphan_booked = ScheduleSlot.objects.filter(status='booked', appointment__isnull=True).count()
+        problems += self.report_check('занятые слоты без записи', orphan_booked)
+
+        free_with_appointment = ScheduleSlot.objects.filter(
+            status__in=('free', 'held'), appointment__isnull=False
+        ).count()
+        problems += self.report_check('свободные или придержанные слоты с записью', free_with_appointment)
+
+        scheduled_not_booked = Appointment.objects.filter(status='scheduled').exclude(slot__status='booked').count()
+        problems += self.report_check('предстоящие записи на незанятых слотах', scheduled_not_booked)
+
+        agenda_missing = ScheduleSlot.objects.filter(agenda_entry__isnull=True).count()
+        problems += self.report_check('слоты без строки расписания (AgendaEntry)', agenda_missing)
+
+        agenda_mismatch = AgendaEntry.objects.filter(
+            ~Q(status=F('slot__status'))
+            | Q(slot__status='booked', appointment_id__isnull=True)
+            | Q(slot__status__in=('free', 'held'), appointment_id__isnull=False)
+        ).count()
+        problems += self.report_check('строки расписания, расходящиеся со слотом', agenda_mismatch)
+
+        problems += self.report_check('дни с неверными счетчиками (DailySlotCounter)', self.counter_mismatches())
+
+        if problems:
+            raise CommandError(f'Нарушено инвариантов: {problems}')
+        self.stdout.write(self.style.SUCCESS('Все инварианты соблюдены'))
+
+    def counter_mismatches(self):
+        actual = {
+            (row['doctor_id'], row['date']): (row['free'], row['booked'], row['total'])
+            for row in ScheduleSlot.objects.values('doctor_id', 'date').annotate(
+                free=Count('id', filter=Q(status='free')),
+                booked=Count('id', filter=Q(status='booked')),
+                total=Count('id'),
+            ).order_by()
+        }
+        stored = {
+            (doctor_id, day): counts
+            for doctor_id, day, *counts in DailySlotCounter.objects.values_list('doctor_id', 'date', 'free', 'booked', 'total')
+        }
+        # Строка счетчика с нулями для дня без слотов допустима
+        return sum(
+            1 for key in actual.keys() | stored.keys()
+            if actual.get(key, (0, 0, 0)) != tuple(stored.get(key, (0, 0, 0)))
+        )
+
+    def report_check(self, title, count):
+        if count:
+            self.stdout.write(self.style.ERROR(f"  {title}: {count}"))
+            return 1
+        self.stdout.write(f"  {title}: 0")
+        return 0
@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from api import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные счетчики слотов (DailySlotCounter) по таблице слотов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, action='append', dest='doctors',
+                            help='Пересчитать только для этого врача (можно указать несколько раз)')
+        parser.add_argument('--date-from', type=date.fromisoformat)
+        parser.add_argument('--date-to', type=date.fromisoformat)
+
+    def handle(self, *args, **options):
+        fixed = counters.rebuild(options['doctors'], options['date_from'], options['date_to'])
+        self.stdout.write(self.style.SUCCESS(f'Исправлено счетчиков: {fixed}'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from api import waitlist
+
+
+class Command(BaseCommand):
+    help = 'Снимает истекшие удержания слотов из листа ожидания и предлагает слоты следующим заявкам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно')
+        parser.add_argument('--interval', type=float, default=30.0, help='Пауза между проходами в секундах')
+        parser.add_argument('--no-reoffer', action='store_true', help='Не предлагать освобожденные слоты заново')
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            # Каждая пачка - отдельная короткая транзакция
+            while True:
+                released = waitlist.release_expired(options['batch_size'], reoffer=not options['no_reoffer'])
+                if not released:
+                    break
+                total += released
+            if total:
+                self.stdout.write(f"Снято истекших удержаний: {total}")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Готово'))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from api import analytics
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводки загрузки врачей (DailyUtilization) за дни, измененные с прошлого запуска'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Сколько дней врачей пересчитывать за раз')
+        parser.add_argument('--full', action='store_true', help='Пересчитать все дни, а не только измененные')
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно')
+        parser.add_argument('--interval', type=float, default=300.0, help='Пауза между проходами в секундах')
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            result = analytics.rollup_changed(options['batch_size'], full=full)
+            self.stdout.write(f"Пересчитано дней: {result['days']} за {result['seconds']} с")
+            full = False
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Готово'))
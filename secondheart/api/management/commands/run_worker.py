@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = 'Воркер фоновых задач: забирает задачи из очереди (SELECT ... FOR UPDATE SKIP LOCKED) и выполняет их'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', dest='kinds',
+                            help='Обрабатывать только задачи этого вида (можно указать несколько раз)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Пауза в секундах, когда очередь пуста')
+        parser.add_argument('--once', action='store_true', help='Разобрать очередь и завершиться')
+        parser.add_argument('--stale-after', type=int, default=int(jobs.LEASE.total_seconds()),
+                            help='Через сколько секунд без продления аренды задача в статусе running '
+                                 'считается брошенной')
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(seconds=options['stale_after'])
+        self.requeue_stale(stale_after)
+
+        while True:
+            job = jobs.claim_job(options['kinds'])
+            if job is None:
+                if options['once']:
+                    break
+                # Пока очередь пуста, подбираем задачи упавших воркеров
+                self.requeue_stale(stale_after)
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Выполняется задача {job}")
+            jobs.run_job(job)
+            if job.status == 'done':
+                self.stdout.write(self.style.SUCCESS(f"Задача {job.pk} выполнена: {job.result}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"Задача {job.pk} завершилась ошибкой: {job.error}"))
+
+    def requeue_stale(self, stale_after):
+        requeued = jobs.requeue_stale(stale_after)
+        if requeued:
+            self.stdout.write(f"Возвращено в очередь брошенных задач: {requeued}")
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from api import reminders
+
+
+class Command(BaseCommand):
+    help = 'Ставит в outbox напоминания о приемах за 24 и за 2 часа (см. api/reminders.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--channel', action='append', dest='channels', choices=reminders.CHANNELS,
+                            help='Канал напоминаний (можно указать несколько раз), по умолчанию все')
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно')
+        parser.add_argument('--interval', type=float, default=60.0, help='Пауза между проходами в секундах')
+
+    def handle(self, *args, **options):
+        channels = options['channels'] or reminders.CHANNELS
+        while True:
+            found = reminders.schedule_reminders(channels=channels)
+            if any(found.values()):
+                self.stdout.write(f"Найдено записей для напоминания: {found}")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Готово'))
@@ -0,0 +1,270 @@
+import random
+import time
+from collections import Counter
+from datetime import date, datetime, time as dtime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from api import catalog, intervals
+from api.models import (
+    Specialty, Doctor, Patient, WorkingHours, ScheduleSlot, Appointment, AgendaEntry, DailySlotCounter,
+)
+
+FIRST_NAMES = ['Иван', 'Петр', 'Анна', 'Мария', 'Олег', 'Елена', 'Сергей', 'Ольга', 'Дмитрий', 'Наталья',
+               'Алексей', 'Татьяна', 'Андрей', 'Юлия', 'Павел', 'Светлана']
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов',
+              'Михайлов', 'Новиков', 'Федоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Козлов']
+SPECIALTIES = ['Терапевт', 'Кардиолог', 'Невролог', 'Хирург', 'Офтальмолог', 'Отоларинголог', 'Эндокринолог',
+               'Дерматолог', 'Гастроэнтеролог', 'Уролог', 'Гинеколог', 'Педиатр']
+
+# Профили рабочих часов: дни недели (ISO) и смены
+HOURS_PROFILES = {
+    'day': ((1, 2, 3, 4, 5), ((dtime(9), dtime(13)), (dtime(14), dtime(18)))),
+    'morning': ((1, 2, 3, 4, 5, 6), ((dtime(8), dtime(14)),)),
+    'evening': ((1, 2, 3, 4, 5), ((dtime(14), dtime(20)),)),
+}
+
+
+def parse_weights(value):
+    weights = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in HOURS_PROFILES:
+            raise CommandError(f"Неизвестный профиль часов: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class TableWriter:
+    """
+    Буфер строк одной таблицы: на Postgres сбрасывается через COPY, иначе через bulk_create.
+    Первичные ключи назначаются заранее, поэтому связи между таблицами строятся без чтения из БД.
+    """
+
+    def __init__(self, model, batch_size, use_copy):
+        self.model = model
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.fields = model._meta.concrete_fields
+        self.auto_dates = [
+            f for f in self.fields if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)
+        ]
+        self.buffer = []
+        self.written = 0
+        self.seconds = 0.0
+        self.next_id = (model.objects.aggregate(m=Max('pk'))['m'] or 0) + 1
+
+    def add(self, **values):
+        obj = self.model(id=self.next_id, **values)
+        self.next_id += 1
+        self.buffer.append(obj)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        return obj
+
+    def flush(self):
+        if not self.buffer:
+            return
+        started = time.perf_counter()
+        if self.use_copy:
+            columns = ', '.join(connection.ops.quote_name(f.column) for f in self.fields)
+            sql = f'COPY {connection.ops.quote_name(self.model._meta.db_table)} ({columns}) FROM STDIN'
+            with connection.cursor() as cursor:
+                with cursor.cursor.copy(sql) as copy:
+                    for obj in self.buffer:
+                        copy.write_row([f.get_db_prep_save(getattr(obj, f.attname), connection) for f in self.fields])
+        else:
+            self.bulk_create()
+        self.seconds += time.perf_counter() - started
+        self.written += len(self.buffer)
+        self.buffer = []
+
+    def bulk_create(self):
+        # pre_save полей auto_now/auto_now_add подставил бы now() вместо исторических дат (COPY пишет
+        # значения как есть). Заданные у всех строк поля на время записи становятся обычными
+        explicit = [f for f in self.auto_dates if all(getattr(obj, f.attname) is not None for obj in self.buffer)]
+        flags = [(f, f.auto_now, f.auto_now_add) for f in explicit]
+        for f in explicit:
+            f.auto_now = f.auto_now_add = False
+        try:
+            self.model.objects.bulk_create(self.buffer, batch_size=self.batch_size)
+        finally:
+            for f, auto_now, auto_now_add in flags:
+                f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Быстро наполняет БД синтетическими данными для нагрузочного тестирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--specialties', type=int, default=8)
+        parser.add_argument('--doctors-per-specialty', type=int, default=50)
+        parser.add_argument('--patients', type=int, default=100000)
+        parser.add_argument('--history-days', type=int, default=90, help='Сколько дней прошлого расписания')
+        parser.add_argument('--future-days', type=int, default=30, help='Сколько дней будущего расписания')
+        parser.add_argument('--booking-rate', type=float, default=0.7, help='Доля занятых слотов')
+        parser.add_argument('--cancel-rate', type=float, default=0.03, help='Доля отмененных слотов')
+        parser.add_argument('--no-show-rate', type=float, default=0.08, help='Доля неявок среди прошлых записей')
+        parser.add_argument('--hours-mix', type=parse_weights, default='day=6,morning=2,evening=2',
+                            help='Распределение профилей рабочих часов, например day=6,morning=2,evening=2')
+        parser.add_argument('--durations', default='15,20,30', help='Длительности приема в минутах')
+        parser.add_argument('--prefix', default='seed', help='Префикс логинов создаваемых пользователей')
+        parser.add_argument('--password', default='seed-pass-123')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--no-copy', action='store_true', help='Не использовать COPY даже на Postgres')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=f"{options['prefix']}_").exists():
+            raise CommandError(f"Пользователи с префиксом {options['prefix']}_ уже есть, укажите другой --prefix")
+
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        # Один хеш на всех: PBKDF2 на каждого пользователя занял бы часы
+        self.password_hash = make_password(options['password'])
+        self.now = timezone.localtime().replace(tzinfo=None)
+        self.today = self.now.date()
+
+        writers = {model: TableWriter(model, options['batch_size'], use_copy) for model in (
+            Specialty, User, Doctor, Patient, WorkingHours, ScheduleSlot, Appointment, AgendaEntry, DailySlotCounter,
+        )}
+        self.writers = writers
+        started = time.perf_counter()
+        self.stdout.write(f"Запись через {'COPY' if use_copy else 'bulk_create'}, seed={options['seed']}")
+
+        with transaction.atomic():
+            doctors = self.seed_doctors()
+            self.flush(Specialty, User, Doctor, WorkingHours)
+            # COPY и bulk_create не шлют post_save, по которым сбрасываются справочники
+            catalog.invalidate(catalog.SPECIALTIES_KEY, catalog.DOCTORS_KEY)
+        with transaction.atomic():
+            patients = self.seed_patients()
+            self.flush(User, Patient)
+        # Расписание - пачками по врачам, каждая пачка в своей транзакции
+        for i in range(0, len(doctors), 20):
+            with transaction.atomic():
+                for doctor in doctors[i:i + 20]:
+                    self.seed_schedule(doctor, patients)
+                self.flush(ScheduleSlot, Appointment, AgendaEntry, DailySlotCounter)
+            self.stdout.write(f"  врачей обработано: {min(i + 20, len(doctors))}/{len(doctors)}")
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), list(writers)):
+                cursor.execute(sql)
+
+        elapsed = time.perf_counter() - started
+        total = sum(w.written for w in writers.values())
+        for model, writer in writers.items():
+            rate = writer.written / writer.seconds if writer.seconds else 0
+            self.stdout.write(f"  {model._meta.label:<22}{writer.written:>12} строк  {rate:>12.0f} строк/с записи")
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано {total} строк за {elapsed:.1f} с ({total / elapsed if elapsed else 0:.0f} строк/с)"
+        ))
+
+    def flush(self, *models):
+        for model in models:
+            self.writers[model].flush()
+
+    def new_user(self, username):
+        return self.writers[User].add(
+            username=username, password=self.password_hash,
+            first_name=self.rng.choice(FIRST_NAMES), last_name=self.rng.choice(LAST_NAMES),
+            email='', is_staff=False, is_superuser=False, is_active=True, date_joined=timezone.now(),
+        )
+
+    def seed_doctors(self):
+        options = self.options
+        durations = [int(d) for d in options['durations'].split(',')]
+        profiles = list(options['hours_mix'])
+        weights = [options['hours_mix'][name] for name in profiles]
+        doctors = []
+        for s in range(options['specialties']):
+            name = SPECIALTIES[s % len(SPECIALTIES)] + ('' if s < len(SPECIALTIES) else f' {s}')
+            specialty = self.writers[Specialty].add(name=name, description='')
+            for _ in range(options['doctors_per_specialty']):
+                user = self.new_user(f"{options['prefix']}_doctor_{len(doctors)}")
+                doctor = self.writers[Doctor].add(
+                    user_id=user.id, specialty_id=specialty.id, is_active=True,
+                    appointment_duration=self.rng.choice(durations),
+                )
+                doctor.full_name = f'{user.first_name} {user.last_name}'
+                weekdays, shifts = HOURS_PROFILES[self.rng.choices(profiles, weights)[0]]
+                doctor.weekly = {}
+                for weekday in weekdays:
+                    for n, (start, end) in enumerate(shifts):
+                        self.writers[WorkingHours].add(
+                            doctor_id=doctor.id, day_of_week=weekday, before_lunch=n == 0,
+                            start_time=start, end_time=end,
+                        )
+                    doctor.weekly[weekday] = intervals.normalize(
+                        [(intervals.to_minutes(s), intervals.to_minutes(e)) for s, e in shifts]
+                    )
+                doctors.append(doctor)
+        return doctors
+
+    def seed_patients(self):
+        patients = []
+        for i in range(self.options['patients']):
+            user = self.new_user(f"{self.options['prefix']}_patient_{i}")
+            patient = self.writers[Patient].add(
+                user_id=user.id, phone_number=f'+7900{self.rng.randrange(10 ** 7):07d}', emergency_contact='',
+                date_of_birth=date(1940, 1, 1) + timedelta(days=self.rng.randrange(365 * 65)),
+            )
+            patients.append((patient.id, f'{user.first_name} {user.last_name}', patient.phone_number))
+        return patients
+
+    def seed_schedule(self, doctor, patients):
+        options = self.options
+        rng = self.rng
+        now = self.now
+        start = self.today - timedelta(days=options['history_days'])
+        tally = {}
+
+        for offset in range(options['history_days'] + options['future_days']):
+            day = start + timedelta(days=offset)
+            for slot_start, slot_end in intervals.split(doctor.weekly.get(day.isoweekday(), []),
+                                                        doctor.appointment_duration):
+                start_time, end_time = intervals.to_time(slot_start), intervals.to_time(slot_end)
+                past = datetime.combine(day, end_time) <= now
+                roll = rng.random()
+                patient = None
+                if roll < options['cancel_rate']:
+                    slot_status = 'cancelled'
+                elif patients and roll < options['cancel_rate'] + options['booking_rate']:
+                    patient = rng.choice(patients)
+                    slot_status = 'completed' if past else 'booked'
+                else:
+                    slot_status = 'free'
+
+                slot = self.writers[ScheduleSlot].add(
+                    doctor_id=doctor.id, date=day, start_time=start_time, end_time=end_time, status=slot_status,
+                )
+                appointment_id = None
+                if patient is not None:
+                    if past:
+                        status = 'no_show' if rng.random() < options['no_show_rate'] else 'completed'
+                    else:
+                        status = 'scheduled'
+                    created = timezone.make_aware(datetime.combine(day, start_time)) - timedelta(
+                        days=rng.randint(1, 14))
+                    appointment_id = self.writers[Appointment].add(
+                        patient_id=patient[0], slot_id=slot.id, status=status, created_at=created, updated_at=created,
+                    ).id
+                self.writers[AgendaEntry].add(
+                    doctor_id=doctor.id, slot_id=slot.id, date=day, start_time=start_time, end_time=end_time,
+                    status=slot_status, appointment_id=appointment_id,
+                    patient_name=patient[1] if patient else '', patient_phone=patient[2] if patient else '',
+                )
+                tally.setdefault(day, Counter())[slot_status] += 1
+
+        for day, statuses in tally.items():
+            self.writers[DailySlotCounter].add(
+                doctor_id=doctor.id, date=day, free=statuses['free'], booked=statuses['booked'],
+                total=sum(statuses.values()),
+            )
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from api import jobs, lifecycle
+
+
+class Command(BaseCommand):
+    help = ('Переводит прошедшие приемы в итоговые статусы (слот - completed, запись - completed/no_show) '
+            'короткими пачками по правилам settings.SWEEP_RULES')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--outcome', choices=lifecycle.OUTCOMES,
+                            help='Итог неотмеченной записи в общем правиле (по умолчанию из SWEEP_RULES)')
+        parser.add_argument('--grace-minutes', type=int,
+                            help='Сколько минут после окончания приема ждать в общем правиле')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.0, help='Пауза между пачками в секундах')
+        parser.add_argument('--max-batches', type=int, help='Не больше стольких пачек за проход')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, что будет переведено')
+        parser.add_argument('--enqueue', action='store_true',
+                            help='Не выполнять, а поставить задачу в очередь для run_worker')
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно')
+        parser.add_argument('--interval', type=float, default=600.0, help='Пауза между проходами в секундах')
+
+    def handle(self, *args, **options):
+        try:
+            rules = lifecycle.get_rules(options['outcome'], options['grace_minutes'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        if options['enqueue']:
+            params = {'batch_size': options['batch_size']}
+            if options['outcome'] is not None:
+                params['outcome'] = options['outcome']
+            if options['grace_minutes'] is not None:
+                params['grace_minutes'] = options['grace_minutes']
+            job = jobs.enqueue('sweep_appointments', params)
+            self.stdout.write(self.style.SUCCESS(f"Задача поставлена в очередь: #{job.pk}"))
+            return
+
+        while True:
+            result = lifecycle.sweep(
+                rules=rules, batch_size=options['batch_size'], pause=options['pause'],
+                max_batches=options['max_batches'], dry_run=options['dry_run'],
+            )
+            prefix = 'Будет переведено' if options['dry_run'] else 'Переведено'
+            self.stdout.write(
+                f"{prefix} слотов: {result['slots']}, записей в completed: {result['completed']}, "
+                f"в no_show: {result['no_show']}, отменено напоминаний: {result['reminders_cancelled']} "
+                f"({result['batches']} пачек за {result['seconds']} с)"
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Готово'))
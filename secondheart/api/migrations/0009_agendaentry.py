@@ -0,0 +1,105 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_agenda(apps, schema_editor):
+    ScheduleSlot = apps.get_model("api", "ScheduleSlot")
+    AgendaEntry = apps.get_model("api", "AgendaEntry")
+
+    batch = []
+    slots = ScheduleSlot.objects.select_related("appointment__patient__user").iterator(
+        chunk_size=2000
+    )
+    for slot in slots:
+        entry = AgendaEntry(
+            doctor_id=slot.doctor_id,
+            slot_id=slot.id,
+            date=slot.date,
+            start_time=slot.start_time,
+            end_time=slot.end_time,
+            status=slot.status,
+        )
+        appointment = getattr(slot, "appointment", None)
+        if appointment is not None:
+            user = appointment.patient.user
+            entry.appointment_id = appointment.id
+            entry.patient_name = f"{user.first_name} {user.last_name}".strip()
+            entry.patient_phone = appointment.patient.phone_number
+        batch.append(entry)
+        if len(batch) >= 2000:
+            AgendaEntry.objects.bulk_create(batch)
+            batch = []
+    AgendaEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_alter_workinghours_unique_together"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AgendaEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("start_time", models.TimeField()),
+                ("end_time", models.TimeField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("free", "Free"),
+                            ("booked", "Booked"),
+                            ("cancelled", "Cancelled"),
+                            ("completed", "Completed"),
+                        ],
+                        default="free",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "appointment_id",
+                    models.PositiveBigIntegerField(blank=True, null=True),
+                ),
+                ("patient_name", models.CharField(blank=True, max_length=301)),
+                ("patient_phone", models.CharField(blank=True, max_length=20)),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="agenda_entries",
+                        to="api.doctor",
+                    ),
+                ),
+                (
+                    "slot",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="agenda_entry",
+                        to="api.scheduleslot",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["doctor", "date", "start_time"],
+                        name="agenda_doctor_date_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_agenda, migrations.RunPython.noop),
+    ]
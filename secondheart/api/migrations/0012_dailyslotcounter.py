@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    ScheduleSlot = apps.get_model("api", "ScheduleSlot")
+    DailySlotCounter = apps.get_model("api", "DailySlotCounter")
+
+    rows = (
+        ScheduleSlot.objects.values("doctor_id", "date")
+        .annotate(
+            free=Count("id", filter=Q(status="free")),
+            booked=Count("id", filter=Q(status="booked")),
+            total=Count("id"),
+        )
+        .order_by()
+    )
+    DailySlotCounter.objects.bulk_create(
+        [DailySlotCounter(**row) for row in rows], batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_scheduleexception"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySlotCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("free", models.IntegerField(default=0)),
+                ("booked", models.IntegerField(default=0)),
+                ("total", models.IntegerField(default=0)),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_counters",
+                        to="api.doctor",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("doctor", "date"), name="unique_doctor_day_counter"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:07
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы на больших таблицах строим CONCURRENTLY, чтобы не блокировать запись
+    atomic = False
+
+    dependencies = [
+        ("api", "0013_idempotencykey"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="appointment",
+            index=models.Index(fields=["created_at"], name="appointment_created_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="appointment",
+            index=models.Index(
+                fields=["status", "created_at"], name="appointment_status_created_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="scheduleslot",
+            index=models.Index(
+                fields=["date", "start_time"], name="slot_date_time_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="scheduleslot",
+            index=models.Index(fields=["status", "date"], name="slot_status_date_idx"),
+        ),
+    ]
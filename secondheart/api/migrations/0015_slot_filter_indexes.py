@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:12
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("api", "0014_admin_list_indexes"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="scheduleslot",
+            index=models.Index(
+                fields=["doctor", "date", "start_time"],
+                name="slot_doctor_date_time_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="scheduleslot",
+            index=models.Index(
+                condition=models.Q(("status", "free")),
+                fields=["doctor", "date", "start_time"],
+                name="slot_free_doctor_date_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,139 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0015_slot_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="agendaentry",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("free", "Free"),
+                    ("held", "Held for waitlist"),
+                    ("booked", "Booked"),
+                    ("cancelled", "Cancelled"),
+                    ("completed", "Completed"),
+                ],
+                default="free",
+                max_length=20,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="scheduleslot",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("free", "Free"),
+                    ("held", "Held for waitlist"),
+                    ("booked", "Booked"),
+                    ("cancelled", "Cancelled"),
+                    ("completed", "Completed"),
+                ],
+                default="free",
+                max_length=20,
+            ),
+        ),
+        migrations.CreateModel(
+            name="WaitlistEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date_from", models.DateField()),
+                ("date_to", models.DateField()),
+                (
+                    "priority",
+                    models.SmallIntegerField(
+                        default=0, help_text="Чем больше, тем раньше предлагается слот"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("waiting", "Waiting"),
+                            ("offered", "Offered"),
+                            ("booked", "Booked"),
+                            ("expired", "Expired"),
+                            ("cancelled", "Cancelled"),
+                        ],
+                        default="waiting",
+                        max_length=20,
+                    ),
+                ),
+                ("offer_expires_at", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="api.doctor",
+                    ),
+                ),
+                (
+                    "offered_slot",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="waitlist_offer",
+                        to="api.scheduleslot",
+                    ),
+                ),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="waitlist_entries",
+                        to="api.patient",
+                    ),
+                ),
+                (
+                    "specialty",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="api.specialty",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "waiting")),
+                        fields=["doctor", "date_from", "-priority", "created_at"],
+                        name="waitlist_doctor_idx",
+                    ),
+                    models.Index(
+                        condition=models.Q(
+                            ("doctor__isnull", True), ("status", "waiting")
+                        ),
+                        fields=["specialty", "date_from", "-priority", "created_at"],
+                        name="waitlist_specialty_idx",
+                    ),
+                    models.Index(
+                        condition=models.Q(("status", "offered")),
+                        fields=["offer_expires_at"],
+                        name="waitlist_offer_expiry_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("api", "0016_waitlistentry"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="scheduleslot",
+            index=models.Index(
+                condition=models.Q(("status", "free")),
+                fields=["date", "start_time"],
+                name="slot_free_date_time_idx",
+            ),
+        ),
+    ]
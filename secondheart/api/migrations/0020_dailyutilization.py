@@ -0,0 +1,83 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0019_reminderoutbox"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyUtilization",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("week", models.DateField(help_text="Понедельник недели")),
+                ("slots", models.IntegerField(default=0)),
+                ("free", models.IntegerField(default=0)),
+                ("held", models.IntegerField(default=0)),
+                ("booked", models.IntegerField(default=0)),
+                ("completed", models.IntegerField(default=0)),
+                ("cancelled", models.IntegerField(default=0)),
+                ("appointments", models.IntegerField(default=0)),
+                ("attended", models.IntegerField(default=0)),
+                ("no_show", models.IntegerField(default=0)),
+                ("appointments_cancelled", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="dailyslotcounter",
+            name="changed_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="dailyslotcounter",
+            index=models.Index(fields=["changed_at"], name="counter_changed_idx"),
+        ),
+        migrations.AddField(
+            model_name="dailyutilization",
+            name="doctor",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="daily_utilization",
+                to="api.doctor",
+            ),
+        ),
+        migrations.AddField(
+            model_name="dailyutilization",
+            name="specialty",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="api.specialty"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dailyutilization",
+            index=models.Index(fields=["date"], name="utilization_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="dailyutilization",
+            index=models.Index(
+                fields=["specialty", "date"], name="utilization_specialty_date_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailyutilization",
+            constraint=models.UniqueConstraint(
+                fields=("doctor", "date"), name="unique_doctor_day_utilization"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:52
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("api", "0020_dailyutilization"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="scheduleslot",
+            index=models.Index(
+                condition=models.Q(("status", "booked")),
+                fields=["date", "start_time"],
+                name="slot_booked_date_time_idx",
+            ),
+        ),
+    ]
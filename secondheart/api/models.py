@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class Patient(models.Model):
@@ -46,9 +47,34 @@ class WorkingHours(models.Model):
         unique_together = ('day_of_week', 'before_lunch', 'doctor')
 
 
+class ScheduleException(models.Model):
+    """
+    Исключение из недельного графика врача на диапазон дат: выходной/блокировка
+    (целый день, если время не указано) или дополнительные рабочие часы.
+    """
+    KIND_CHOICES = [
+        ('blocked', 'Blocked'),
+        ('extra', 'Extra working hours'),
+    ]
+
+    doctor = models.ForeignKey("Doctor", on_delete=models.CASCADE, related_name='schedule_exceptions')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='blocked')
+    date_from = models.DateField()
+    date_to = models.DateField()
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    reason = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'date_to', 'date_from'], name='exception_doctor_dates_idx'),
+        ]
+
+
 class ScheduleSlot(models.Model):
     STATUS_CHOICES = [
         ('free', 'Free'),
+        ('held', 'Held for waitlist'),
         ('booked', 'Booked'),
         ('cancelled', 'Cancelled'),
         ('completed', 'Completed'),
@@ -60,6 +86,23 @@ class ScheduleSlot(models.Model):
     end_time = models.TimeField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='free')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'start_time'], name='slot_date_time_idx'),
+            models.Index(fields=['status', 'date'], name='slot_status_date_idx'),
+            models.Index(fields=['doctor', 'date', 'start_time'], name='slot_doctor_date_time_idx'),
+            # Частичный индекс только по свободным слотам - основной запрос пациентов
+            models.Index(fields=['doctor', 'date', 'start_time'], condition=models.Q(status='free'),
+                         name='slot_free_doctor_date_idx'),
+            # Ближайший свободный слот по специальности/группе врачей (booking.book_next_available)
+            models.Index(fields=['date', 'start_time'], condition=models.Q(status='free'),
+                         name='slot_free_date_time_idx'),
+            # Занятые слоты по времени: окно напоминаний (api/reminders.py) и пачки перевода прошедших
+            # приемов в completed (api/lifecycle.py). Прошедшие приемы из индекса уходят
+            models.Index(fields=['date', 'start_time'], condition=models.Q(status='booked'),
+                         name='slot_booked_date_time_idx'),
+        ]
+
 
 class Appointment(models.Model):
     STATUS_CHOICES = [
@@ -74,3 +117,272 @@ class Appointment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='appointment_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='appointment_status_created_idx'),
+        ]
+
+
+class AgendaEntry(models.Model):
+    """
+    Денормализованная строка расписания врача для doctor_dashboard.
+    Обновляется вместе со слотом/записью (см. api/agenda.py), чтобы день или неделя
+    врача читались одним range scan по индексу без join'ов slot -> appointment -> patient -> user.
+    """
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='agenda_entries')
+    slot = models.OneToOneField(ScheduleSlot, on_delete=models.CASCADE, related_name='agenda_entry')
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    status = models.CharField(max_length=20, choices=ScheduleSlot.STATUS_CHOICES, default='free')
+    appointment_id = models.PositiveBigIntegerField(null=True, blank=True)
+    patient_name = models.CharField(max_length=301, blank=True)
+    patient_phone = models.CharField(max_length=20, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'date', 'start_time'], name='agenda_doctor_date_idx'),
+        ]
+
+
+class Job(models.Model):
+    """
+    Фоновая задача в очереди на базе БД. Задачи забирает команда run_worker
+    (см. api/jobs.py), HTTP-запрос только ставит задачу в очередь.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Аренда задачи: воркер обновляет поле, пока выполняет задачу (см. jobs.Heartbeat)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='job_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class DailySlotCounter(models.Model):
+    """
+    Счетчики слотов врача за день для календаря-"тепловой карты".
+    Обновляются F-выражениями вместе со слотами (см. api/counters.py),
+    расхождения исправляет команда rebuild_counters.
+    """
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='daily_counters')
+    date = models.DateField()
+    free = models.IntegerField(default=0)
+    booked = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    # Время последнего изменения слотов или записей дня - по нему rollup_stats находит измененные дни
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date'], name='unique_doctor_day_counter'),
+        ]
+        indexes = [
+            models.Index(fields=['changed_at'], name='counter_changed_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Сохраненный ответ на POST-запрос с заголовком Idempotency-Key (см. api/idempotency.py).
+    Повтор запроса с тем же ключом получает этот ответ вместо повторного выполнения.
+    """
+    STATUS_CHOICES = [
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+    ]
+
+    scope = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing')
+    response_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Начало выполнения (аренда): запись 'processing' старше IDEMPOTENCY_PROCESSING_LEASE
+    # осталась от упавшего процесса, и ее перехватывает повтор запроса
+    processing_started_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_key'),
+        ]
+
+
+class WaitlistEntry(models.Model):
+    """
+    Заявка пациента в лист ожидания к врачу (или к любому врачу специальности) на диапазон дат.
+    Освободившийся слот придерживается за лучшей заявкой на короткое время (см. api/waitlist.py).
+    """
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('offered', 'Offered'),
+        ('booked', 'Booked'),
+        ('expired', 'Expired'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='waitlist_entries')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, null=True, blank=True)
+    specialty = models.ForeignKey(Specialty, on_delete=models.CASCADE, null=True, blank=True)
+    date_from = models.DateField()
+    date_to = models.DateField()
+    priority = models.SmallIntegerField(default=0, help_text="Чем больше, тем раньше предлагается слот")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
+    offered_slot = models.OneToOneField(ScheduleSlot, on_delete=models.SET_NULL, null=True, blank=True,
+                                        related_name='waitlist_offer')
+    offer_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Поиск лучшей заявки на освободившийся слот - только среди ожидающих
+            models.Index(fields=['doctor', 'date_from', '-priority', 'created_at'],
+                         condition=models.Q(status='waiting'), name='waitlist_doctor_idx'),
+            models.Index(fields=['specialty', 'date_from', '-priority', 'created_at'],
+                         condition=models.Q(status='waiting', doctor__isnull=True), name='waitlist_specialty_idx'),
+            models.Index(fields=['offer_expires_at'], condition=models.Q(status='offered'),
+                         name='waitlist_offer_expiry_idx'),
+        ]
+
+
+class RequestProfile(models.Model):
+    """
+    Профиль одного HTTP-запроса: статистика cProfile (формат pstats) и список SQL-запросов
+    с длительностями. Пишет api.profiling.ProfilerMiddleware, смотреть - в админке.
+    """
+    path = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    sql_count = models.PositiveIntegerField(default=0)
+    sql_ms = models.FloatField(default=0)
+    trigger = models.CharField(max_length=10)  # request - заголовок/параметр, sample - выборка 1 из N
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    pstats = models.BinaryField()
+    queries = models.JSONField(default=list)  # [{'sql': ..., 'ms': ...}]
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['view_name', '-duration_ms'], name='profile_view_duration_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class Checkpoint(models.Model):
+    """
+    Позиция (водяной знак) инкрементальной фоновой обработки, например планировщика напоминаний.
+    Обновляется в той же транзакции, что и результат обработки, поэтому перезапуск продолжает с нее.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    value = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ReminderOutbox(models.Model):
+    """
+    Напоминание о приеме к отправке (outbox). Строки создает api.reminders.schedule_reminders,
+    отправляет команда dispatch_outbox. Уникальность (запись, вид, канал) делает постановку идемпотентной.
+    """
+    KIND_CHOICES = [
+        ('24h', '24 hours before'),
+        ('2h', '2 hours before'),
+    ]
+    CHANNEL_CHOICES = [
+        ('sms', 'SMS'),
+        ('email', 'E-mail'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='reminders')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=254)
+    message = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True, help_text="Не отправлять повторно раньше")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['appointment', 'kind', 'channel'], name='unique_reminder'),
+        ]
+        indexes = [
+            # Очередь на отправку: только ожидающие строки
+            models.Index(fields=['id'], condition=models.Q(status='pending'), name='outbox_pending_idx'),
+            models.Index(fields=['claimed_at'], condition=models.Q(status='sending'), name='outbox_sending_idx'),
+        ]
+
+
+class DailyUtilization(models.Model):
+    """
+    Сводка загрузки врача за день для аналитики: слоты по статусам и исходы записей.
+    Заполняется инкрементально командой rollup_stats (см. api/analytics.py), эндпоинты аналитики
+    читают только эту таблицу.
+    """
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='daily_utilization')
+    specialty = models.ForeignKey(Specialty, on_delete=models.CASCADE)
+    date = models.DateField()
+    week = models.DateField(help_text="Понедельник недели")
+    slots = models.IntegerField(default=0)
+    free = models.IntegerField(default=0)
+    held = models.IntegerField(default=0)
+    booked = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+    appointments = models.IntegerField(default=0)
+    attended = models.IntegerField(default=0)
+    no_show = models.IntegerField(default=0)
+    appointments_cancelled = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date'], name='unique_doctor_day_utilization'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='utilization_date_idx'),
+            models.Index(fields=['specialty', 'date'], name='utilization_specialty_date_idx'),
+        ]
@@ -0,0 +1,262 @@
+"""
+Массовый импорт пациентов и врачей из CSV/NDJSON.
+
+Строки читаются потоково и обрабатываются пачками: пачка валидируется
+(уникальность логинов и специальности - одним запросом на пачку), пароли хешируются
+в пуле процессов, затем User и Patient/Doctor вставляются через bulk_create в одной транзакции.
+
+Из API импорт идет фоновой задачей (jobs 'import_people'): файл сохраняется в settings.IMPORT_UPLOAD_DIR,
+воркер читает его оттуда. Пул хеширования запускается через spawn (api/hashing.py): fork процесса
+с уже запущенными потоками (слушатель логов, продление аренды задачи) небезопасен.
+"""
+import csv
+import io
+import json
+import os
+import time
+import uuid
+from datetime import date
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.db import DatabaseError, transaction
+
+from . import catalog, hashing
+from .models import Patient, Doctor, Specialty
+
+ROLES = ('patient', 'doctor')
+FORMATS = ('csv', 'ndjson')
+CHUNK_SIZE = 1000
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+_username_validator = UnicodeUsernameValidator()
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []  # [{'row': номер строки, 'errors': {...}}]
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, row_number, errors):
+        self.errors.append({'row': row_number, 'errors': errors})
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': len(self.errors),
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'errors': self.errors,
+        }
+
+
+def read_rows(stream, fmt):
+    """Итератор (номер строки, dict) по текстовому потоку."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else {'__invalid__': True}
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+def _text(row, field, errors, required=True, max_length=None):
+    value = row.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        errors[field] = 'This field is required.'
+    elif max_length and len(value) > max_length:
+        errors[field] = f'Ensure this field has no more than {max_length} characters.'
+    return value
+
+
+def _validate_row(row, role, specialty_ids):
+    """Возвращает (поля пользователя, поля профиля, ошибки)."""
+    if row.get('__invalid__'):
+        return None, None, {'row': 'Invalid JSON object.'}
+
+    errors = {}
+    user = {
+        'username': _text(row, 'username', errors, max_length=150),
+        'password': _text(row, 'password', errors),
+        'first_name': _text(row, 'first_name', errors, required=False, max_length=150),
+        'last_name': _text(row, 'last_name', errors, required=False, max_length=150),
+    }
+    if 'username' not in errors:
+        try:
+            _username_validator(user['username'])
+        except ValidationError as e:
+            errors['username'] = e.messages[0]
+    if 'password' not in errors:
+        # Те же AUTH_PASSWORD_VALIDATORS, что и при регистрации
+        try:
+            validate_password(user['password'], User(
+                username=user['username'], first_name=user['first_name'], last_name=user['last_name']
+            ))
+        except ValidationError as e:
+            errors['password'] = ' '.join(e.messages)
+
+    if role == 'patient':
+        profile = {
+            'phone_number': _text(row, 'phone_number', errors, max_length=20),
+            'emergency_contact': _text(row, 'emergency_contact', errors, required=False, max_length=100),
+        }
+        try:
+            profile['date_of_birth'] = date.fromisoformat(_text(row, 'date_of_birth', errors))
+        except ValueError:
+            errors.setdefault('date_of_birth', 'Date has wrong format. Use YYYY-MM-DD.')
+    else:
+        profile = {}
+        try:
+            profile['specialty_id'] = int(row.get('specialty') or 0)
+        except (TypeError, ValueError):
+            profile['specialty_id'] = 0
+        if profile['specialty_id'] not in specialty_ids:
+            errors['specialty'] = 'Invalid specialty id.'
+        try:
+            profile['appointment_duration'] = int(row.get('appointment_duration') or 30)
+            if profile['appointment_duration'] <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors['appointment_duration'] = 'A positive integer is required.'
+        # Пустое значение (пустая колонка CSV, null в NDJSON) - как отсутствие колонки: врач активен.
+        # Нераспознанное значение - ошибка строки, а не молчаливая деактивация
+        is_active = row.get('is_active')
+        if isinstance(is_active, str):
+            is_active = is_active.strip().lower()
+        if is_active in (None, ''):
+            profile['is_active'] = True
+        elif isinstance(is_active, int) and is_active in (0, 1):
+            profile['is_active'] = bool(is_active)
+        elif is_active in TRUE_VALUES or is_active in FALSE_VALUES:
+            profile['is_active'] = is_active in TRUE_VALUES
+        else:
+            errors['is_active'] = 'Must be one of: true, false, 1, 0, yes, no.'
+
+    return user, profile, errors
+
+
+def _import_chunk(chunk, role, specialty_ids, pool, report):
+    valid = []
+    seen = set()
+    for row_number, row in chunk:
+        user, profile, errors = _validate_row(row, role, specialty_ids)
+        if not errors and user['username'] in seen:
+            errors = {'username': 'Duplicate username in the input.'}
+        if errors:
+            report.add_error(row_number, errors)
+            continue
+        seen.add(user['username'])
+        valid.append((row_number, user, profile))
+
+    # Уникальность логинов проверяем одним запросом на пачку
+    taken = set(User.objects.filter(username__in=seen).values_list('username', flat=True))
+    if taken:
+        for row_number, user, _ in valid:
+            if user['username'] in taken:
+                report.add_error(row_number, {'username': 'A user with that username already exists.'})
+        valid = [item for item in valid if item[1]['username'] not in taken]
+    if not valid:
+        return
+
+    passwords = [user.pop('password') for _, user, _ in valid]
+    if pool is not None:
+        hashes = list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // 32)))
+    else:
+        hashes = [make_password(password) for password in passwords]
+
+    try:
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(password=password_hash, **user)
+                for (_, user, _), password_hash in zip(valid, hashes)
+            ])
+            model = Patient if role == 'patient' else Doctor
+            model.objects.bulk_create([
+                model(user=user, **profile) for user, (_, _, profile) in zip(users, valid)
+            ])
+            if role == 'doctor':
+                # bulk_create не шлет post_save - справочник врачей сбрасываем сами
+                catalog.invalidate(catalog.DOCTORS_KEY)
+    except DatabaseError as e:
+        # Например, логин заняли параллельно - вся пачка откатывается
+        for row_number, _, _ in valid:
+            report.add_error(row_number, {'row': f'Database error: {e}'})
+        return
+    report.created += len(valid)
+
+
+def import_people(stream, role, fmt='csv', chunk_size=CHUNK_SIZE, workers=None, on_chunk=None):
+    """
+    Импортирует людей роли `role` из текстового потока. `workers` - число процессов
+    для хеширования паролей (по умолчанию по числу CPU, 0 - без пула).
+    `on_chunk(report)` вызывается после каждой пачки.
+    """
+    if role not in ROLES:
+        raise ValueError(f"Unknown role: {role}")
+    report = ImportReport()
+    specialty_ids = set(Specialty.objects.values_list('id', flat=True)) if role == 'doctor' else set()
+    workers = os.cpu_count() if workers is None else workers
+    pool = hashing.make_pool(workers) if workers else None
+
+    try:
+        rows = read_rows(stream, fmt)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            report.rows += len(chunk)
+            _import_chunk(chunk, role, specialty_ids, pool, report)
+            report.elapsed = time.perf_counter() - report.started
+            if on_chunk is not None:
+                on_chunk(report)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    report.elapsed = time.perf_counter() - report.started
+    report.errors.sort(key=lambda error: error['row'])
+    return report
+
+
+def _storage():
+    return FileSystemStorage(location=getattr(settings, 'IMPORT_UPLOAD_DIR', 'imports'))
+
+
+def save_upload(upload, fmt):
+    """Сохраняет загруженный файл для фоновой задачи; возвращает его имя в IMPORT_UPLOAD_DIR."""
+    return _storage().save(f'{uuid.uuid4().hex}.{fmt}', upload)
+
+
+def import_upload(name, role, fmt, **kwargs):
+    """Импортирует файл, сохраненный save_upload, и удаляет его."""
+    storage = _storage()
+    try:
+        with storage.open(name, 'rb') as f:
+            return import_people(io.TextIOWrapper(f, encoding='utf-8', newline=''), role, fmt, **kwargs)
+    finally:
+        storage.delete(name)
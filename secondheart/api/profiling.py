@@ -0,0 +1,141 @@
+"""
+Профилирование отдельных запросов в продакшене.
+
+ProfilerMiddleware включается для сотрудника (is_staff) заголовком "X-Profile: 1" или
+параметром ?_profile=1 (вход по сессии, Bearer-токену или Basic), а также для каждого N-го
+запроса (settings.PROFILER_SAMPLE_EVERY).
+Запрос выполняется под cProfile, SQL-запросы собираются через execute_wrapper на всех
+подключениях; результат сохраняется в RequestProfile, id профиля - в заголовке ответа X-Profile-Id.
+"""
+import cProfile
+import itertools
+import logging
+import marshal
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import exceptions
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_X_PROFILE'
+QUERY_PARAM = '_profile'
+RESPONSE_HEADER = 'X-Profile-Id'
+MAX_QUERIES = 2000  # больше в профиле не храним, счетчик и суммарное время считаются по всем
+
+_counter = itertools.count(1)
+
+
+class QueryCollector:
+    """execute_wrapper: запоминает текст и длительность каждого SQL-запроса."""
+
+    def __init__(self):
+        self.queries = []
+        self.count = 0
+        self.total_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            self.count += 1
+            self.total_ms += ms
+            if len(self.queries) < MAX_QUERIES:
+                self.queries.append({
+                    'sql': sql, 'ms': round(ms, 3), 'many': many, 'db': context['connection'].alias,
+                })
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    # request.user заполняет только сессия: токен и Basic DRF проверяет уже во view, после middleware.
+    # Проверяем их заранее теми же аутентификаторами
+    drf_request = Request(request)
+    for authenticator_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        if issubclass(authenticator_class, SessionAuthentication):
+            continue
+        try:
+            result = authenticator_class().authenticate(drf_request)
+        except exceptions.APIException:
+            return False
+        if result is not None:
+            return result[0].is_staff
+    return False
+
+
+def _trigger(request):
+    if request.META.get(HEADER) == '1' or request.GET.get(QUERY_PARAM) == '1':
+        return 'request' if _is_staff(request) else None
+    every = getattr(settings, 'PROFILER_SAMPLE_EVERY', 0)
+    if every and next(_counter) % every == 0:
+        return 'sample'
+    return None
+
+
+class ProfilerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = _trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        collector = QueryCollector()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            try:
+                profiler.enable()
+            except ValueError:
+                # Уже работает другой профилировщик (например, отладчик) - выполняем запрос как есть
+                return self.get_response(request)
+            started = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            duration_ms = (time.perf_counter() - started) * 1000
+
+        try:
+            profile = self.save(request, response, trigger, profiler, collector, duration_ms)
+        except Exception:
+            # Профиль - диагностика: его сбой не должен ломать ответ
+            logger.exception("Failed to save request profile")
+        else:
+            response[RESPONSE_HEADER] = str(profile.pk)
+        return response
+
+    def save(self, request, response, trigger, profiler, collector, duration_ms):
+        profiler.create_stats()
+        match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        profile = RequestProfile.objects.create(
+            path=request.path[:255],
+            method=request.method,
+            view_name=(match.view_name or match._func_path)[:200] if match else '',
+            status_code=response.status_code,
+            duration_ms=round(duration_ms, 3),
+            sql_count=collector.count,
+            sql_ms=round(collector.total_ms, 3),
+            trigger=trigger,
+            user=user if user is not None and user.is_authenticated else None,
+            # Тот же формат, что у Profile.dump_stats: файл открывается pstats.Stats и snakeviz
+            pstats=marshal.dumps(profiler.stats),
+            queries=collector.queries,
+        )
+        # Храним только последние PROFILER_KEEP профилей
+        RequestProfile.objects.filter(pk__lte=profile.pk - getattr(settings, 'PROFILER_KEEP', 500)).delete()
+        return profile
@@ -0,0 +1,206 @@
+"""
+Напоминания о приеме за 24 и за 2 часа.
+
+schedule_reminders() находит записи, для которых наступил момент напоминания, одним диапазонным
+запросом по (date, start_time) занятых слотов и идемпотентно добавляет строки в ReminderOutbox
+(уникальность запись + вид + канал). Граница просмотренного окна хранится в Checkpoint - своем
+для каждого набора каналов, иначе проход только по sms сдвинул бы окно и для email.
+
+dispatch_batch() забирает пачку строк (SKIP LOCKED), переводит их в sending, отправляет через
+транспорт settings.REMINDER_TRANSPORT и отмечает результат. Неудачная отправка повторяется не
+раньше next_attempt_at - с экспоненциально растущей паузой. Строка, зависшая в sending после
+падения воркера, повторно сама не отправляется - только после requeue_stale().
+"""
+import json
+import logging
+import sys
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Checkpoint, ReminderOutbox, ScheduleSlot
+
+logger = logging.getLogger(__name__)
+
+OFFSETS = {'24h': timedelta(hours=24), '2h': timedelta(hours=2)}
+CHANNELS = ('sms', 'email')
+CHECKPOINT = 'reminders.scheduler'
+
+
+# --- Транспорты ---
+
+class ConsoleTransport:
+    """Печатает сообщения в stdout - заглушка для разработки."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, reminder):
+        self.stream.write(f"[{reminder.channel}] {reminder.recipient}: {reminder.message}\n")
+
+
+class FileTransport:
+    """Дописывает сообщения в файл settings.REMINDER_FILE_PATH (JSON Lines) - для тестов и локальной проверки."""
+
+    def __init__(self, path=None):
+        self.path = path or getattr(settings, 'REMINDER_FILE_PATH', 'reminders.jsonl')
+
+    def send(self, reminder):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'id': reminder.pk, 'appointment': reminder.appointment_id, 'kind': reminder.kind,
+                'channel': reminder.channel, 'recipient': reminder.recipient, 'message': reminder.message,
+            }, ensure_ascii=False) + '\n')
+
+
+def get_transport():
+    return import_string(getattr(settings, 'REMINDER_TRANSPORT', 'api.reminders.ConsoleTransport'))()
+
+
+# --- Планировщик ---
+
+def _starts_after(moment):
+    return Q(date__gt=moment.date()) | Q(date=moment.date(), start_time__gt=moment.time())
+
+
+def _starts_not_after(moment):
+    return Q(date__lt=moment.date()) | Q(date=moment.date(), start_time__lte=moment.time())
+
+
+def _message(slot_date, start_time, doctor_name):
+    return f"Напоминание: {slot_date:%d.%m.%Y} в {start_time:%H:%M} у вас прием у врача {doctor_name}."
+
+
+def _checkpoint_name(channels):
+    # Полный набор каналов - под прежним именем, чтобы не потерять уже просмотренное окно
+    channels = sorted(set(channels))
+    return CHECKPOINT if channels == sorted(CHANNELS) else f"{CHECKPOINT}:{','.join(channels)}"
+
+
+def schedule_reminders(now=None, channels=CHANNELS):
+    """
+    Ставит в outbox напоминания, момент которых (начало приема минус 24ч/2ч) наступил с прошлого прохода.
+    Возвращает {вид: число найденных записей}.
+    """
+    # Слоты хранят локальные дату и время
+    now = now or timezone.localtime().replace(tzinfo=None)
+    found = {}
+    with transaction.atomic():
+        # Блокировка строки не дает двум планировщикам обработать одно окно параллельно
+        checkpoint, _ = Checkpoint.objects.select_for_update().get_or_create(
+            name=_checkpoint_name(channels)
+        )
+        last = checkpoint.value.get('scanned_until')
+        last = datetime.fromisoformat(last) if last else None
+
+        for kind, offset in OFFSETS.items():
+            # Момент напоминания в (last, now] <=> начало приема в (last + offset, now + offset];
+            # о прошедших приемах (например, после долгого простоя) не напоминаем
+            lower = now if last is None else max(last + offset, now)
+            upper = now + offset
+            if lower >= upper:
+                found[kind] = 0
+                continue
+            rows = list(
+                ScheduleSlot.objects.filter(status='booked', date__range=(lower.date(), upper.date()))
+                .filter(_starts_after(lower), _starts_not_after(upper), appointment__status='scheduled')
+                .values_list('appointment__id', 'date', 'start_time', 'appointment__patient__phone_number',
+                             'appointment__patient__user__email', 'doctor__user__first_name',
+                             'doctor__user__last_name')
+            )
+            reminders = []
+            for appointment_id, slot_date, start_time, phone, email, first_name, last_name in rows:
+                message = _message(slot_date, start_time, f'{first_name} {last_name}'.strip())
+                recipients = {'sms': phone, 'email': email}
+                for channel in channels:
+                    if recipients[channel]:
+                        reminders.append(ReminderOutbox(
+                            appointment_id=appointment_id, kind=kind, channel=channel,
+                            recipient=recipients[channel], message=message,
+                        ))
+            # Повторный проход по тому же окну ничего не дублирует
+            ReminderOutbox.objects.bulk_create(reminders, batch_size=1000, ignore_conflicts=True)
+            found[kind] = len(rows)
+
+        checkpoint.value = {'scanned_until': now.isoformat()}
+        checkpoint.save(update_fields=['value', 'updated_at'])
+    return found
+
+
+# --- Отправка ---
+
+def claim_batch(batch_size=200):
+    """
+    Забирает пачку ожидающих напоминаний, срок повтора которых наступил, и переводит их в sending.
+    Отмененные записи не отправляются.
+    """
+    with transaction.atomic():
+        batch = list(
+            ReminderOutbox.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(status='pending')
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now()))
+            .select_related('appointment').order_by('id')[:batch_size]
+        )
+        if not batch:
+            return []
+        stale = [reminder.pk for reminder in batch if reminder.appointment.status != 'scheduled']
+        to_send = [reminder for reminder in batch if reminder.appointment.status == 'scheduled']
+        if stale:
+            ReminderOutbox.objects.filter(pk__in=stale).update(status='cancelled')
+        ReminderOutbox.objects.filter(pk__in=[reminder.pk for reminder in to_send]).update(
+            status='sending', claimed_at=timezone.now(), attempts=F('attempts') + 1
+        )
+    return to_send
+
+
+def retry_delay(attempts):
+    """Пауза перед следующей попыткой после `attempts` неудачных: REMINDER_RETRY_DELAY, 2x, 4x... до максимума."""
+    base = getattr(settings, 'REMINDER_RETRY_DELAY', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), getattr(settings, 'REMINDER_RETRY_MAX_DELAY', 3600)))
+
+
+def dispatch_batch(transport, batch_size=200, max_attempts=5):
+    """
+    Отправляет одну пачку. Возвращает {'sent': ..., 'retry': ..., 'failed': ...} или None, если очередь пуста.
+    """
+    batch = claim_batch(batch_size)
+    if not batch:
+        return None
+
+    sent, errors = [], {}
+    for reminder in batch:
+        try:
+            transport.send(reminder)
+        except Exception as e:
+            logger.warning("Reminder %s was not sent: %s", reminder.pk, e)
+            # attempts в памяти - до увеличения в claim_batch
+            errors[reminder.pk] = (reminder.attempts + 1, str(e))
+        else:
+            sent.append(reminder.pk)
+
+    now = timezone.now()
+    ReminderOutbox.objects.filter(pk__in=sent).update(status='sent', sent_at=now)
+    retried = 0
+    for pk, (attempts, error) in errors.items():
+        if attempts < max_attempts:
+            retried += 1
+            ReminderOutbox.objects.filter(pk=pk).update(
+                status='pending', error=error, next_attempt_at=now + retry_delay(attempts)
+            )
+        else:
+            ReminderOutbox.objects.filter(pk=pk).update(status='failed', error=error)
+    return {'sent': len(sent), 'retry': retried, 'failed': len(errors) - retried}
+
+
+def requeue_stale(older_than):
+    """
+    Возвращает в очередь напоминания, зависшие в sending (воркер упал во время отправки).
+    Такие сообщения могли уйти, поэтому вызывается только явно.
+    """
+    return ReminderOutbox.objects.filter(
+        status='sending', claimed_at__lt=timezone.now() - older_than
+    ).update(status='pending')
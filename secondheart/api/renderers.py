@@ -0,0 +1,23 @@
+import csv
+import io
+
+from rest_framework import renderers
+
+
+class CSVRenderer(renderers.BaseRenderer):
+    """Отдает список словарей как CSV (?format=csv); столбцы - ключи первой строки."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            # Ошибки (например, 400) - одной строкой
+            data = [data]
+        if not data:
+            return ''
+        stream = io.StringIO()
+        writer = csv.DictWriter(stream, fieldnames=list(data[0]), extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(data)
+        return stream.getvalue()
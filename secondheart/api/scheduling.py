@@ -0,0 +1,210 @@
+from collections import Counter
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Doctor, ScheduleSlot, WorkingHours, ScheduleException, AgendaEntry
+from . import agenda, counters, intervals
+
+
+class CompiledTemplate:
+    """
+    Скомпилированный график врача на диапазон дат: рабочие интервалы по дням недели
+    и исключения по датам, уже отсортированные и слитые (см. api/intervals.py).
+    """
+
+    def __init__(self, weekly, blocked, extra):
+        self.weekly = weekly    # isoweekday -> [(start, end), ...]
+        self.blocked = blocked  # date -> [(start, end), ...]
+        self.extra = extra      # date -> [(start, end), ...]
+
+    def intervals_for(self, day):
+        """Рабочие интервалы на конкретную дату с учетом исключений."""
+        working = self.weekly.get(day.isoweekday(), [])
+        if day in self.extra:
+            working = intervals.union(working, self.extra[day])
+        if day in self.blocked:
+            working = intervals.subtract(working, self.blocked[day])
+        return working
+
+
+WHOLE_DAY = (0, 24 * 60)
+
+
+def _exception_interval(exception):
+    if exception.start_time is None or exception.end_time is None:
+        return WHOLE_DAY
+    return intervals.to_minutes(exception.start_time), intervals.to_minutes(exception.end_time)
+
+
+def compile_templates(doctor_ids, start_date, end_date):
+    """
+    Компилирует графики сразу для многих врачей двумя запросами
+    (WorkingHours и ScheduleException за период). Возвращает {doctor_id: CompiledTemplate}.
+    """
+    weekly = {doctor_id: {} for doctor_id in doctor_ids}
+    for doctor_id, day_of_week, start_time, end_time in WorkingHours.objects.filter(
+            doctor_id__in=doctor_ids
+    ).values_list('doctor_id', 'day_of_week', 'start_time', 'end_time'):
+        weekly[doctor_id].setdefault(day_of_week, []).append(
+            (intervals.to_minutes(start_time), intervals.to_minutes(end_time))
+        )
+
+    exceptions = {doctor_id: ({}, {}) for doctor_id in doctor_ids}
+    for exception in ScheduleException.objects.filter(
+            doctor_id__in=doctor_ids, date_to__gte=start_date, date_from__lte=end_date
+    ):
+        blocked, extra = exceptions[exception.doctor_id]
+        target = blocked if exception.kind == 'blocked' else extra
+        interval = _exception_interval(exception)
+        day = max(exception.date_from, start_date)
+        while day <= min(exception.date_to, end_date):
+            target.setdefault(day, []).append(interval)
+            day += timedelta(days=1)
+
+    templates = {}
+    for doctor_id in doctor_ids:
+        blocked, extra = exceptions[doctor_id]
+        templates[doctor_id] = CompiledTemplate(
+            {weekday: intervals.normalize(items) for weekday, items in weekly[doctor_id].items()},
+            {day: intervals.normalize(items) for day, items in blocked.items()},
+            {day: intervals.normalize(items) for day, items in extra.items()},
+        )
+    return templates
+
+
+def generate_doctor_slots(doctor, start_date, days, on_day=None, template=None):
+    """
+    Нарезает свободные слоты врача на `days` дней начиная с `start_date` по его графику
+    с учетом исключений. Время, занятое уже существующими слотами дня (в любом статусе), вычитается
+    из рабочих интервалов, поэтому новые слоты не пересекаются со старыми, даже если сетка сдвинулась.
+    Каждый день - отдельная транзакция под блокировкой строки врача, так что параллельные генерации
+    (задачи воркеров, apply_exception_change) по одному врачу не создают одинаковых слотов.
+    `template` - заранее скомпилированный график (для пакетной генерации по многим врачам).
+    `on_day(index, created_so_far)` вызывается после каждого дня - для отчета о прогрессе.
+    Возвращает количество созданных слотов.
+    """
+    end_date = start_date + timedelta(days=days - 1)
+    if template is None:
+        template = compile_templates([doctor.id], start_date, end_date)[doctor.id]
+
+    created_count = 0
+    for i in range(days):
+        current_date = start_date + timedelta(days=i)
+        working = template.intervals_for(current_date)
+
+        if working:
+            with transaction.atomic():
+                # Существующие слоты читаются под блокировкой врача: без нее две генерации прочли бы
+                # одно и то же и обе вставили бы недостающие слоты
+                Doctor.objects.select_for_update().only('id').get(pk=doctor.pk)
+                existing = [
+                    (intervals.to_minutes(start_time), intervals.to_minutes(end_time))
+                    for start_time, end_time in ScheduleSlot.objects.filter(
+                        doctor=doctor, date=current_date
+                    ).values_list('start_time', 'end_time')
+                ]
+                new_slots = [
+                    ScheduleSlot(
+                        doctor=doctor,
+                        date=current_date,
+                        start_time=intervals.to_time(start),
+                        end_time=intervals.to_time(end),
+                        status='free'
+                    )
+                    for start, end in intervals.split(
+                        intervals.subtract(working, intervals.normalize(existing)), doctor.appointment_duration
+                    )
+                ]
+                if new_slots:
+                    # Слоты дня и строки расписания врача сохраняются одной транзакцией
+                    new_slots = ScheduleSlot.objects.bulk_create(new_slots)
+                    agenda.add_slots(new_slots)
+                    counters.add_slots(new_slots)
+            created_count += len(new_slots)
+
+        if on_day is not None:
+            on_day(i + 1, created_count)
+
+    return created_count
+
+
+def _inside(interval, working):
+    return any(start <= interval[0] and interval[1] <= end for start, end in working)
+
+
+def _intersects(interval, occupied):
+    return any(start < interval[1] and interval[0] < end for start, end in occupied)
+
+
+def apply_exception_change(doctor, date_from, date_to, generate=False):
+    """
+    Приводит слоты врача за период к графику с учетом исключений - после создания, изменения
+    или удаления исключения:
+    - свободные слоты вне рабочих интервалов отменяются (занятые и придержанные не трогаем -
+      запись пациента отменяется отдельно);
+    - отмененные слоты без записи, снова попавшие в рабочие интервалы, становятся свободными,
+      если не пересекаются с действующими слотами;
+    - в днях, уже сгенерированных для врача (до его последнего слота), недостающие слоты дорезаются.
+    generate=True - дорезать все дни периода (дополнительные часы на еще не сгенерированные даты).
+    Прошедшие дни не меняются. Возвращает {'cancelled': n, 'restored': n, 'created': n}.
+    """
+    result = {'cancelled': 0, 'restored': 0, 'created': 0}
+    date_from = max(date_from, date.today())
+    if date_from > date_to:
+        return result
+    template = compile_templates([doctor.id], date_from, date_to)[doctor.id]
+
+    with transaction.atomic():
+        # Врач блокируется до слотов - как в generate_doctor_slots, которая вызывается ниже
+        Doctor.objects.select_for_update().only('id').get(pk=doctor.pk)
+        by_day = {}
+        for slot in (
+                ScheduleSlot.objects.select_for_update(of=('self',))
+                .filter(doctor=doctor, date__range=(date_from, date_to))
+                .values('id', 'date', 'start_time', 'end_time', 'status', 'appointment__id')
+                .order_by('date', 'start_time')
+        ):
+            by_day.setdefault(slot['date'], []).append(slot)
+
+        to_cancel, to_restore = [], []
+        for day, slots in by_day.items():
+            working = template.intervals_for(day)
+            spans = {
+                slot['id']: (intervals.to_minutes(slot['start_time']), intervals.to_minutes(slot['end_time']))
+                for slot in slots
+            }
+            cancel = [slot for slot in slots if slot['status'] == 'free' and not _inside(spans[slot['id']], working)]
+            cancel_ids = {slot['id'] for slot in cancel}
+            occupied = intervals.normalize(
+                spans[slot['id']] for slot in slots if slot['status'] != 'cancelled' and slot['id'] not in cancel_ids
+            )
+            for slot in slots:
+                span = spans[slot['id']]
+                if (slot['status'] == 'cancelled' and slot['appointment__id'] is None
+                        and _inside(span, working) and not _intersects(span, occupied)):
+                    to_restore.append(slot)
+                    occupied = intervals.union(occupied, [span])
+            to_cancel.extend(cancel)
+
+        for slots, old_status, new_status in ((to_cancel, 'free', 'cancelled'), (to_restore, 'cancelled', 'free')):
+            slot_ids = [slot['id'] for slot in slots]
+            ScheduleSlot.objects.filter(id__in=slot_ids).update(status=new_status)
+            AgendaEntry.objects.filter(slot_id__in=slot_ids).update(status=new_status)
+            for day, count in Counter(slot['date'] for slot in slots).items():
+                counters.move(doctor.id, day, old_status, new_status, count)
+        result['cancelled'] = len(to_cancel)
+        result['restored'] = len(to_restore)
+
+        if generate:
+            last_day = date_to
+        else:
+            # Дни после последнего слота врача еще не генерировались - их не трогаем
+            last_slot = ScheduleSlot.objects.filter(doctor=doctor).aggregate(last=Max('date'))['last']
+            last_day = min(date_to, last_slot) if last_slot else None
+        if last_day is not None and last_day >= date_from:
+            result['created'] = generate_doctor_slots(
+                doctor, date_from, (last_day - date_from).days + 1, template=template
+            )
+    return result
@@ -1,8 +1,11 @@
 from django.contrib.auth.models import User
+from django.db import transaction
 from rest_framework import serializers
 from .models import (
-    Patient, Doctor, Specialty, Appointment, WorkingHours, ScheduleSlot
+    Patient, Doctor, Specialty, Appointment, WorkingHours, ScheduleSlot, AgendaEntry, Job,
+    ScheduleException, WaitlistEntry
 )
+from . import agenda, counters, intervals
 
 
 # --- Базовые сериализаторы ---
@@ -27,6 +30,54 @@ class WorkingHoursSerializer(serializers.ModelSerializer):
 
         read_only_fields = ['doctor']
 
+    def validate(self, attrs):
+        start_time = attrs.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = attrs.get('end_time', getattr(self.instance, 'end_time', None))
+        day_of_week = attrs.get('day_of_week', getattr(self.instance, 'day_of_week', None))
+        if start_time >= end_time:
+            raise serializers.ValidationError("Время начала должно быть раньше времени окончания.")
+
+        # Смены одного дня не должны пересекаться
+        request = self.context.get('request')
+        doctor = self.instance.doctor if self.instance else getattr(request.user, 'doctor_profile', None)
+        if doctor is not None:
+            others = WorkingHours.objects.filter(doctor=doctor, day_of_week=day_of_week)
+            if self.instance:
+                others = others.exclude(pk=self.instance.pk)
+            new_interval = (intervals.to_minutes(start_time), intervals.to_minutes(end_time))
+            day_intervals = [
+                (intervals.to_minutes(s), intervals.to_minutes(e))
+                for s, e in others.values_list('start_time', 'end_time')
+            ]
+            if any(new_interval in pair for pair in intervals.find_overlaps(day_intervals + [new_interval])):
+                raise serializers.ValidationError("Интервал пересекается с другой сменой этого дня.")
+        return attrs
+
+
+class ScheduleExceptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ScheduleException
+        fields = "__all__"
+
+        read_only_fields = ['doctor']
+
+    def validate(self, attrs):
+        date_from = attrs.get('date_from', getattr(self.instance, 'date_from', None))
+        date_to = attrs.get('date_to', getattr(self.instance, 'date_to', None))
+        start_time = attrs.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = attrs.get('end_time', getattr(self.instance, 'end_time', None))
+        kind = attrs.get('kind', getattr(self.instance, 'kind', 'blocked'))
+
+        if date_from > date_to:
+            raise serializers.ValidationError("Дата начала должна быть не позже даты окончания.")
+        if (start_time is None) != (end_time is None):
+            raise serializers.ValidationError("Укажите и время начала, и время окончания, либо ни одно из них.")
+        if start_time is not None and start_time >= end_time:
+            raise serializers.ValidationError("Время начала должно быть раньше времени окончания.")
+        if kind == 'extra' and start_time is None:
+            raise serializers.ValidationError("Для дополнительных часов нужно указать время.")
+        return attrs
+
 
 # --- Врачи ---
 
@@ -105,7 +156,8 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
     # Эти поля для записи (принимаем ID)
     patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all())
-    slot = serializers.PrimaryKeyRelatedField(queryset=ScheduleSlot.objects.filter(status='free'))
+    # held - слот, придержанный за пациентом из листа ожидания (проверяется в create)
+    slot = serializers.PrimaryKeyRelatedField(queryset=ScheduleSlot.objects.filter(status__in=['free', 'held']))
 
     class Meta:
         model = Appointment
@@ -113,8 +165,101 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         # Логика: при создании записи, слот должен стать занятым
-        slot = validated_data['slot']
-        slot.status = 'booked'
-        slot.save()
+        with transaction.atomic():
+            # Блокируем строку слота: проверка статуса при валидации шла без блокировки,
+            # и параллельный запрос мог успеть занять слот
+            slot = ScheduleSlot.objects.select_for_update().get(pk=validated_data['slot'].pk)
+            old_status = slot.status
+            if slot.status == 'held':
+                # Придержанный слот может занять только пациент, которому он предложен. Заявка
+                # блокируется после слота - как в waitlist.cancel_entry и release_expired
+                offer = WaitlistEntry.objects.select_for_update().filter(offered_slot=slot, status='offered').first()
+                if offer is None or offer.patient_id != validated_data['patient'].id:
+                    raise serializers.ValidationError({'slot': ['Этот слот уже занят.']})
+                offer.status = 'booked'
+                offer.save(update_fields=['status'])
+            elif slot.status != 'free':
+                raise serializers.ValidationError({'slot': ['Этот слот уже занят.']})
+            validated_data['slot'] = slot
+            slot.status = 'booked'
+            slot.save()
+
+            appointment = super().create(validated_data)
+            agenda.sync_slot(slot, appointment)
+            counters.move(slot.doctor_id, slot.date, old_status, 'booked')
+        return appointment
+
+
+class NextAvailableSerializer(serializers.Serializer):
+    """Параметры записи на ближайший свободный слот (POST /api/appointments/next_available/)."""
+    # Пациенту не нужно указывать себя; врач или админ записывает указанного пациента
+    patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all(), required=False)
+    doctors = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all(), many=True, required=False)
+    specialty = serializers.PrimaryKeyRelatedField(queryset=Specialty.objects.all(), required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField()
+    time_from = serializers.TimeField(required=False)
+    time_to = serializers.TimeField(required=False)
+
+    def validate(self, attrs):
+        if not attrs.get('doctors') and not attrs.get('specialty'):
+            raise serializers.ValidationError("Укажите врачей или специальность.")
+        if attrs.get('date_from') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("Дата начала должна быть не позже даты окончания.")
+        if attrs.get('time_from') and attrs.get('time_to') and attrs['time_from'] >= attrs['time_to']:
+            raise serializers.ValidationError("Время начала должно быть раньше времени окончания.")
+
+        user = self.context['request'].user
+        if hasattr(user, 'patient_profile'):
+            attrs['patient'] = user.patient_profile
+        elif not attrs.get('patient'):
+            raise serializers.ValidationError({'patient': ['This field is required.']})
+        return attrs
+
+
+# --- Лист ожидания ---
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    offered_slot_details = ScheduleSlotSerializer(source='offered_slot', read_only=True)
 
-        return super().create(validated_data)
+    class Meta:
+        model = WaitlistEntry
+        fields = ["id", "doctor", "specialty", "date_from", "date_to", "priority", "status", "offered_slot",
+                  "offered_slot_details", "offer_expires_at", "created_at"]
+        read_only_fields = ["priority", "status", "offered_slot", "offer_expires_at"]
+
+    def validate(self, attrs):
+        if not attrs.get('doctor') and not attrs.get('specialty'):
+            raise serializers.ValidationError("Укажите врача или специальность.")
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("Дата начала должна быть не позже даты окончания.")
+        if attrs.get('doctor'):
+            # Заявку к конкретному врачу ищем по врачу, специальность не нужна
+            attrs['specialty'] = None
+        return attrs
+
+
+# --- Расписание врача (денормализованное) ---
+
+class AgendaEntrySerializer(serializers.ModelSerializer):
+    # Формат совпадает с ScheduleSlotSerializer, чтобы дашборд врача работал без изменений
+    id = serializers.IntegerField(source='slot_id', read_only=True)
+    patient_info = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AgendaEntry
+        fields = ['id', 'date', 'start_time', 'end_time', 'status', 'appointment_id', 'patient_info']
+
+    def get_patient_info(self, obj):
+        if obj.appointment_id is None:
+            return None
+        return {'full_name': obj.patient_name, 'phone_number': obj.patient_phone}
+
+
+# --- Фоновые задачи ---
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ["id", "kind", "status", "progress", "total", "result", "error", "created_at", "started_at",
+                  "finished_at"]
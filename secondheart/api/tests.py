@@ -1,3 +1,633 @@
-from django.test import TestCase
+import io
+import threading
+from datetime import date, datetime, time, timedelta
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from . import agenda, authentication, catalog, counters, idempotency, intervals, lifecycle, people_import, reminders, \
+    scheduling, waitlist
+from .models import Specialty, Doctor, WorkingHours, ScheduleSlot, DailySlotCounter, Patient, Appointment, \
+    IdempotencyKey, ReminderOutbox, RequestProfile, WaitlistEntry
+from .serializers import AppointmentSerializer
+
+
+class IntervalsTests(SimpleTestCase):
+    def test_normalize_sorts_merges_and_drops_empty(self):
+        self.assertEqual(intervals.normalize([(60, 90), (0, 30), (30, 45), (50, 50), (80, 120), (10, 5)]),
+                         [(0, 45), (60, 120)])
+
+    def test_normalize_keeps_contained_interval_inside(self):
+        self.assertEqual(intervals.normalize([(0, 100), (10, 20)]), [(0, 100)])
+
+    def test_find_overlaps_ignores_adjacent(self):
+        self.assertEqual(intervals.find_overlaps([(0, 30), (30, 60)]), [])
+
+    def test_find_overlaps_reports_nested_and_crossing(self):
+        self.assertEqual(
+            intervals.find_overlaps([(0, 100), (10, 20), (90, 120)]),
+            [((0, 100), (10, 20)), ((0, 100), (90, 120))],
+        )
+
+    def test_union(self):
+        self.assertEqual(intervals.union([(0, 30)], [(30, 60), (90, 100)]), [(0, 60), (90, 100)])
+
+    def test_subtract_cut_in_middle(self):
+        self.assertEqual(intervals.subtract([(0, 100)], [(40, 60)]), [(0, 40), (60, 100)])
+
+    def test_subtract_cut_covering_interval(self):
+        self.assertEqual(intervals.subtract([(10, 20), (30, 40)], [(0, 35)]), [(35, 40)])
+
+    def test_subtract_cut_spanning_two_intervals(self):
+        self.assertEqual(intervals.subtract([(0, 30), (40, 70)], [(20, 50)]), [(0, 20), (50, 70)])
+
+    def test_subtract_several_cuts_and_edges(self):
+        self.assertEqual(
+            intervals.subtract([(0, 100)], [(0, 10), (20, 30), (90, 100)]),
+            [(10, 20), (30, 90)],
+        )
+
+    def test_subtract_without_cuts_and_from_empty(self):
+        self.assertEqual(intervals.subtract([(0, 10)], []), [(0, 10)])
+        self.assertEqual(intervals.subtract([], [(0, 10)]), [])
+
+    def test_split_drops_short_tail(self):
+        self.assertEqual(list(intervals.split([(0, 70), (100, 130)], 30)), [(0, 30), (30, 60), (100, 130)])
+
+    def test_minutes_round_trip(self):
+        self.assertEqual(intervals.to_minutes(time(10, 40)), 640)
+        self.assertEqual(intervals.to_time(640), time(10, 40))
+
+
+class ScheduleExceptionTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('doc', password='x')
+        self.doctor = Doctor.objects.create(user=user, specialty=Specialty.objects.create(name='Терапевт'))
+        for day in range(1, 8):
+            WorkingHours.objects.create(doctor=self.doctor, day_of_week=day, start_time=time(9), end_time=time(12))
+        self.day = date.today() + timedelta(days=7)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def spans(self, **filters):
+        return list(
+            ScheduleSlot.objects.filter(doctor=self.doctor, date=self.day, **filters)
+            .order_by('start_time').values_list('start_time', 'end_time')
+        )
+
+    def assert_consistent(self):
+        slots = ScheduleSlot.objects.filter(doctor=self.doctor, date=self.day).exclude(status='cancelled')
+        spans = [(intervals.to_minutes(s.start_time), intervals.to_minutes(s.end_time)) for s in slots]
+        self.assertEqual(intervals.find_overlaps(spans), [])
+        for slot in ScheduleSlot.objects.filter(doctor=self.doctor):
+            self.assertEqual(slot.agenda_entry.status, slot.status)
+        counter = DailySlotCounter.objects.get(doctor=self.doctor, date=self.day)
+        self.assertEqual(counter.free, ScheduleSlot.objects.filter(doctor=self.doctor, date=self.day,
+                                                                   status='free').count())
+        self.assertEqual(counter.total, ScheduleSlot.objects.filter(doctor=self.doctor, date=self.day).count())
+
+    def book(self, start_time):
+        slot = ScheduleSlot.objects.get(doctor=self.doctor, date=self.day, start_time=start_time)
+        patient_user = User.objects.create_user('pat', password='x')
+        patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1), phone_number='1')
+        slot.status = 'booked'
+        slot.save()
+        appointment = Appointment.objects.create(patient=patient, slot=slot)
+        agenda.sync_slot(slot, appointment)
+        counters.move(self.doctor.id, self.day, 'free', 'booked')
+        return slot
+
+    def test_generation_skips_time_taken_by_shifted_grid(self):
+        scheduling.generate_doctor_slots(self.doctor, self.day, 1)
+        self.book(time(10, 30))
+        ScheduleSlot.objects.filter(doctor=self.doctor, date=self.day, status='free').delete()
+        counters.rebuild([self.doctor.id])
+        self.doctor.appointment_duration = 40
+        self.doctor.save()
+
+        created = scheduling.generate_doctor_slots(self.doctor, self.day, 1)
+
+        # Сетка по 40 минут дала бы 10:20-11:00 поверх занятого 10:30-11:00
+        self.assertEqual(created, 3)
+        self.assertEqual(self.spans(), [(time(9), time(9, 40)), (time(9, 40), time(10, 20)),
+                                        (time(10, 30), time(11)), (time(11), time(11, 40))])
+        self.assert_consistent()
+
+    def test_blocked_exception_keeps_booked_slot(self):
+        scheduling.generate_doctor_slots(self.doctor, self.day, 1)
+        self.book(time(10))
+        self.client.post('/api/schedule_exceptions/', {
+            'kind': 'blocked', 'date_from': self.day, 'date_to': self.day,
+        })
+
+        self.assertEqual(self.spans(status='booked'), [(time(10), time(10, 30))])
+        self.assertEqual(len(self.spans(status='cancelled')), 5)
+        self.assert_consistent()
+
+    def test_blocked_exception_cancels_and_restores_on_delete(self):
+        scheduling.generate_doctor_slots(self.doctor, self.day, 1)
+        response = self.client.post('/api/schedule_exceptions/', {
+            'kind': 'blocked', 'date_from': self.day, 'date_to': self.day,
+            'start_time': '10:00', 'end_time': '11:00',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.spans(status='cancelled'), [(time(10), time(10, 30)), (time(10, 30), time(11))])
+        self.assert_consistent()
+
+        response = self.client.delete(f"/api/schedule_exceptions/{response.json()['id']}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.spans(status='cancelled'), [])
+        self.assertEqual(len(self.spans(status='free')), 6)
+        self.assert_consistent()
+
+    def test_update_moves_block(self):
+        scheduling.generate_doctor_slots(self.doctor, self.day, 1)
+        exception_id = self.client.post('/api/schedule_exceptions/', {
+            'kind': 'blocked', 'date_from': self.day, 'date_to': self.day,
+            'start_time': '09:00', 'end_time': '10:00',
+        }).json()['id']
+
+        response = self.client.patch(f'/api/schedule_exceptions/{exception_id}/',
+                                     {'start_time': '11:00', 'end_time': '12:00'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.spans(status='cancelled'), [(time(11), time(11, 30)), (time(11, 30), time(12))])
+        self.assert_consistent()
+
+    def test_extra_exception_generates_slots_without_overlap(self):
+        scheduling.generate_doctor_slots(self.doctor, self.day, 1)
+        response = self.client.post('/api/schedule_exceptions/', {
+            'kind': 'extra', 'date_from': self.day, 'date_to': self.day,
+            'start_time': '11:45', 'end_time': '13:15',
+        })
+
+        self.assertEqual(response.status_code, 201)
+        # 12:00-13:15 дорезается от конца существующих слотов, хвост короче приема отбрасывается
+        self.assertEqual(self.spans()[-2:], [(time(12), time(12, 30)), (time(12, 30), time(13))])
+        self.assert_consistent()
+
+    def test_extra_exception_on_not_generated_day(self):
+        response = self.client.post('/api/schedule_exceptions/', {
+            'kind': 'extra', 'date_from': self.day, 'date_to': self.day,
+            'start_time': '14:00', 'end_time': '15:00',
+        })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.spans()), 8)
+        self.assert_consistent()
+
+
+class AgendaTests(TestCase):
+    def test_invalid_dates_are_rejected(self):
+        user = User.objects.create_user('doc', password='x')
+        Doctor.objects.create(user=user, specialty=Specialty.objects.create(name='Терапевт'))
+        client = APIClient()
+        client.force_authenticate(user)
+
+        self.assertEqual(client.get('/api/agenda/', {'date_from': 'abc'}).status_code, 400)
+        self.assertEqual(client.get('/api/agenda/', {'date_to': '2030-13-01'}).status_code, 400)
+        self.assertEqual(client.get('/api/agenda/', {'date_from': '2030-01-01'}).status_code, 200)
+
+
+class CountersTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('doc', password='x')
+        self.doctor = Doctor.objects.create(user=user, specialty=Specialty.objects.create(name='Терапевт'))
+        WorkingHours.objects.create(doctor=self.doctor, day_of_week=1, start_time=time(9), end_time=time(10))
+        self.day = date.today() + timedelta(days=7 - date.today().weekday())
+        scheduling.generate_doctor_slots(self.doctor, self.day, 1)
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def test_rebuild_fixes_only_drifted_rows_in_place(self):
+        counter = DailySlotCounter.objects.get(doctor=self.doctor, date=self.day)
+        DailySlotCounter.objects.filter(pk=counter.pk).update(free=7)
+
+        self.assertEqual(counters.rebuild([self.doctor.id]), 1)
+        fixed = DailySlotCounter.objects.get(doctor=self.doctor, date=self.day)
+        self.assertEqual((fixed.pk, fixed.free, fixed.booked, fixed.total), (counter.pk, 2, 0, 2))
+        self.assertEqual(counters.rebuild([self.doctor.id]), 0)
+
+    def test_rebuild_zeroes_days_without_slots(self):
+        ScheduleSlot.objects.filter(doctor=self.doctor).delete()
+
+        counters.rebuild([self.doctor.id])
+
+        counter = DailySlotCounter.objects.get(doctor=self.doctor, date=self.day)
+        self.assertEqual((counter.free, counter.total), (0, 0))
+        response = self.client.get('/api/calendar/', {'doctor': self.doctor.id, 'date_from': self.day})
+        self.assertEqual(response.json(), [])
+
+    def test_calendar_rejects_non_numeric_ids(self):
+        self.assertEqual(self.client.get('/api/calendar/', {'doctor': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/calendar/', {'specialty': 'x'}).status_code, 400)
+        response = self.client.get('/api/calendar/', {'doctor': self.doctor.id, 'date_from': self.day})
+        self.assertEqual(response.json(), [{'date': self.day.isoformat(), 'free': 2, 'booked': 0, 'total': 2}])
+
+
+class IdempotencyLeaseTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def make_record(self, started_ago):
+        return IdempotencyKey.objects.create(
+            scope='user:1', key='k', request_hash='h', processing_started_at=self.now - started_ago,
+            expires_at=self.now + timedelta(days=1),
+        )
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_fresh_processing_key_is_not_taken_over(self):
+        self.make_record(timedelta(seconds=1))
+        response, started_at = idempotency._claim('user:1', 'k', 'h')
+        self.assertEqual(response.status_code, 409)
+        self.assertIsNone(started_at)
+
+    @override_settings(IDEMPOTENCY_PROCESSING_LEASE=60)
+    def test_abandoned_processing_key_is_taken_over_once(self):
+        record = self.make_record(timedelta(minutes=5))
+
+        response, started_at = idempotency._claim('user:1', 'k', 'h')
+
+        self.assertIsNone(response)
+        record.refresh_from_db()
+        self.assertEqual(record.processing_started_at, started_at)
+        # Опоздавший первый запрос не перезаписывает результат и не снимает чужую аренду
+        self.assertEqual(idempotency._own('user:1', 'k', self.now - timedelta(minutes=5)).delete()[0], 0)
+        self.assertTrue(IdempotencyKey.objects.filter(pk=record.pk, status='processing').exists())
+
+
+@override_settings(AUTH_USER_CACHE_LOCAL=True)
+class CachedUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('pat', password='secret', is_staff=True)
+        self.patient = Patient.objects.create(user=self.user, date_of_birth=date(1990, 1, 1), phone_number='1')
+
+    def test_cache_keeps_no_password_hash(self):
+        authentication.get_cached_user(self.user.pk)
+
+        data = cache.get(authentication._user_cache_key(self.user.pk))
+        self.assertNotIn('password', data['user'])
+        self.assertNotIn(self.user.password, repr(data))
+
+    def test_cached_user_needs_no_queries(self):
+        authentication.get_cached_user(self.user.pk)
+
+        with self.assertNumQueries(0):
+            user = authentication.get_cached_user(self.user.pk)
+            self.assertEqual(user.get_session_auth_hash(), self.user.get_session_auth_hash())
+            self.assertEqual(user.patient_profile.id, self.patient.id)
+            self.assertFalse(hasattr(user, 'doctor_profile'))
+            self.assertTrue(user.is_staff)
+
+    def test_saving_cached_user_keeps_password(self):
+        authentication.get_cached_user(self.user.pk)
+        user = authentication.get_cached_user(self.user.pk)
+
+        user.first_name = 'Иван'
+        user.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Иван')
+        self.assertTrue(self.user.check_password('secret'))
+
+    @override_settings(AUTH_USER_CACHE_LOCAL=False)
+    def test_local_cache_is_not_used_by_default(self):
+        authentication.get_cached_user(self.user.pk)
+
+        self.assertIsNone(cache.get(authentication._user_cache_key(self.user.pk)))
+        with self.assertNumQueries(1):
+            self.assertEqual(authentication.get_cached_user(self.user.pk).patient_profile.id, self.patient.id)
+
+
+class SlotRaceTestCase(TransactionTestCase):
+    """Общая часть тестов гонок за слот: расписание на `days` дней по одному слоту и пациент."""
+    days = 10
+
+    def setUp(self):
+        user = User.objects.create_user('doc', password='x')
+        self.doctor = Doctor.objects.create(user=user, specialty=Specialty.objects.create(name='Терапевт'))
+        for day in range(1, 8):
+            WorkingHours.objects.create(doctor=self.doctor, day_of_week=day, start_time=time(9), end_time=time(9, 30))
+        self.first_day = date.today() + timedelta(days=1)
+        scheduling.generate_doctor_slots(self.doctor, self.first_day, self.days)
+        patient_user = User.objects.create_user('pat', password='x')
+        self.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1), phone_number='1')
+
+    def book(self, slot, patient=None):
+        serializer = AppointmentSerializer(data={'patient': (patient or self.patient).pk, 'slot': slot.pk})
+        try:
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        except ValidationError:
+            pass  # слот успели занять или освободить и отдать - допустимый исход
+
+    def run_concurrently(self, *funcs):
+        barrier = threading.Barrier(len(funcs))
+        errors = []
+
+        def run(func):
+            try:
+                barrier.wait()
+                func()
+            except Exception as e:  # в том числе deadlock detected
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(func,)) for func in funcs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+        self.assertFalse(any(thread.is_alive() for thread in threads), 'потоки зависли')
+        self.assertEqual(errors, [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'нужны построчные блокировки PostgreSQL')
+class WaitlistLockOrderTests(SlotRaceTestCase):
+    """Бронирование придержанного слота одновременно с его освобождением не должно взаимно блокироваться."""
+
+    def hold(self, slot, expired=False):
+        entry = WaitlistEntry.objects.create(patient=self.patient, doctor=self.doctor,
+                                             date_from=slot.date, date_to=slot.date)
+        with transaction.atomic():
+            self.assertEqual(waitlist.offer_slot(slot).pk, entry.pk)
+        if expired:
+            WaitlistEntry.objects.filter(pk=entry.pk).update(offer_expires_at=timezone.now() - timedelta(seconds=1))
+        return entry
+
+    def assert_consistent(self, slot, entry):
+        slot.refresh_from_db()
+        entry.refresh_from_db()
+        has_appointment = Appointment.objects.filter(slot=slot).exists()
+        self.assertEqual(slot.status == 'booked', has_appointment)
+        self.assertIn(slot.status, ('booked', 'free'))
+        if entry.status == 'booked':
+            self.assertEqual(slot.status, 'booked')
+        else:
+            self.assertIn(entry.status, ('cancelled', 'expired'))
+            self.assertIsNone(entry.offered_slot_id)
+        self.assertEqual(slot.agenda_entry.status, slot.status)
+
+    def test_book_held_slot_vs_cancel(self):
+        for slot in ScheduleSlot.objects.filter(doctor=self.doctor):
+            entry = self.hold(slot)
+            self.run_concurrently(lambda: self.book(slot), lambda: waitlist.cancel_entry(entry.pk))
+            self.assert_consistent(slot, entry)
+        self.assertEqual(counters.rebuild([self.doctor.id]), 0)
+
+    def test_book_held_slot_vs_expire(self):
+        for slot in ScheduleSlot.objects.filter(doctor=self.doctor):
+            entry = self.hold(slot, expired=True)
+            self.run_concurrently(lambda: self.book(slot), lambda: waitlist.release_expired())
+            self.assert_consistent(slot, entry)
+        # Удержания, пропущенные из-за занятых слотов, снимаются следующим проходом
+        while waitlist.release_expired():
+            pass
+        self.assertFalse(WaitlistEntry.objects.filter(status='offered').exists())
+        self.assertEqual(counters.rebuild([self.doctor.id]), 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'нужны построчные блокировки PostgreSQL')
+class AppointmentCancelRaceTests(SlotRaceTestCase):
+    """Отмена записи одновременно с другой отменой или с записью на освобождаемый слот."""
+
+    def setUp(self):
+        super().setUp()
+        other_user = User.objects.create_user('pat2', password='x')
+        self.other = Patient.objects.create(user=other_user, date_of_birth=date(1990, 1, 1), phone_number='2')
+
+    def cancel(self, appointment_id):
+        client = APIClient()
+        client.force_authenticate(self.patient.user)
+        response = client.delete(f'/api/appointments/{appointment_id}/')
+        # Второй запрос видит запись уже удаленной (404) или выходит под блокировкой (204)
+        self.assertIn(response.status_code, (204, 404))
+
+    def booked(self, slot):
+        self.book(slot)
+        return Appointment.objects.get(slot=slot)
+
+    def assert_consistent(self, slot):
+        slot.refresh_from_db()
+        self.assertEqual(slot.status == 'booked', Appointment.objects.filter(slot=slot).exists())
+        self.assertEqual(slot.agenda_entry.status, slot.status)
+
+    def test_concurrent_cancels(self):
+        for slot in ScheduleSlot.objects.filter(doctor=self.doctor):
+            WaitlistEntry.objects.create(patient=self.other, doctor=self.doctor, date_from=slot.date, date_to=slot.date)
+            appointment = self.booked(slot)
+            self.run_concurrently(lambda: self.cancel(appointment.pk), lambda: self.cancel(appointment.pk))
+            self.assert_consistent(slot)
+            # Слот освобожден один раз и предложен одной заявке
+            self.assertEqual(slot.status, 'held')
+            self.assertEqual(WaitlistEntry.objects.filter(offered_slot=slot, status='offered').count(), 1)
+        self.assertEqual(counters.rebuild([self.doctor.id]), 0)
+
+    def test_cancel_vs_booking_freed_slot(self):
+        for slot in ScheduleSlot.objects.filter(doctor=self.doctor):
+            appointment = self.booked(slot)
+            self.run_concurrently(lambda: self.cancel(appointment.pk), lambda: self.book(slot, self.other))
+            self.assert_consistent(slot)
+        self.assertEqual(counters.rebuild([self.doctor.id]), 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'нужны построчные блокировки PostgreSQL')
+class GenerationRaceTests(SlotRaceTestCase):
+    def test_concurrent_generation_creates_each_slot_once(self):
+        ScheduleSlot.objects.filter(doctor=self.doctor).delete()
+        counters.rebuild([self.doctor.id])
+
+        generate = lambda: scheduling.generate_doctor_slots(self.doctor, self.first_day, self.days)  # noqa: E731
+        self.run_concurrently(generate, generate)
+
+        self.assertEqual(ScheduleSlot.objects.filter(doctor=self.doctor).count(), self.days)
+        self.assertEqual(counters.rebuild([self.doctor.id]), 0)
+
+
+class ProfilerTriggerTests(TestCase):
+    def profile_id(self, user):
+        token = authentication.make_token(user)
+        response = self.client.get('/api/me/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        return response.get('X-Profile-Id')
+
+    def test_token_authenticated_staff_is_profiled(self):
+        user = User.objects.create_user('admin', password='x', is_staff=True)
+
+        profile = RequestProfile.objects.get(pk=self.profile_id(user))
+
+        self.assertEqual((profile.trigger, profile.user), ('request', user))
+
+    def test_token_authenticated_non_staff_is_not_profiled(self):
+        self.assertIsNone(self.profile_id(User.objects.create_user('pat', password='x')))
+        self.assertFalse(RequestProfile.objects.exists())
+
+
+class FailingTransport:
+    def send(self, reminder):
+        raise ConnectionError('gateway is down')
+
+
+class RemindersTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('doc', password='x')
+        doctor = Doctor.objects.create(user=user, specialty=Specialty.objects.create(name='Терапевт'))
+        patient_user = User.objects.create_user('pat', password='x', email='pat@example.com')
+        patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1), phone_number='+7900')
+        self.start = datetime(2030, 1, 10, 10, 0)
+        slot = ScheduleSlot.objects.create(doctor=doctor, date=self.start.date(), start_time=self.start.time(),
+                                           end_time=time(10, 30), status='booked')
+        self.appointment = Appointment.objects.create(patient=patient, slot=slot)
+
+    def channels(self, kind='24h'):
+        return set(ReminderOutbox.objects.filter(kind=kind).values_list('channel', flat=True))
+
+    def test_channel_subset_does_not_advance_other_channels(self):
+        moment = self.start - reminders.OFFSETS['24h']
+        reminders.schedule_reminders(now=moment - timedelta(hours=1))
+
+        reminders.schedule_reminders(now=moment, channels=('sms',))
+        self.assertEqual(self.channels(), {'sms'})
+
+        reminders.schedule_reminders(now=moment + timedelta(minutes=1))
+        self.assertEqual(self.channels(), {'sms', 'email'})
+
+    @override_settings(REMINDER_RETRY_DELAY=60, REMINDER_RETRY_MAX_DELAY=100)
+    def test_failed_send_waits_for_backoff(self):
+        reminder = ReminderOutbox.objects.create(appointment=self.appointment, kind='2h', channel='sms',
+                                                 recipient='+7900', message='m')
+
+        started = timezone.now()
+        self.assertEqual(reminders.dispatch_batch(FailingTransport()), {'sent': 0, 'retry': 1, 'failed': 0})
+        reminder.refresh_from_db()
+        self.assertEqual((reminder.status, reminder.attempts), ('pending', 1))
+        self.assertGreaterEqual(reminder.next_attempt_at, started + timedelta(seconds=60))
+        self.assertIsNone(reminders.dispatch_batch(FailingTransport()))
+
+        ReminderOutbox.objects.filter(pk=reminder.pk).update(next_attempt_at=timezone.now())
+        reminders.dispatch_batch(FailingTransport())
+        reminder.refresh_from_db()
+        self.assertGreaterEqual(reminder.next_attempt_at, started + timedelta(seconds=100))
+        self.assertEqual([reminders.retry_delay(n).seconds for n in (1, 2, 3)], [60, 100, 100])
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Specialty.objects.create(name='Терапевт')
+
+    @override_settings(LOCAL_CACHE=True, CATALOG_CACHE_LOCAL=False)
+    def test_local_cache_is_not_used_by_default(self):
+        catalog.get_specialties()
+
+        self.assertIsNone(cache.get(catalog.SPECIALTIES_KEY))
+        Specialty.objects.update(name='Кардиолог')
+        self.assertEqual([row['name'] for row in catalog.get_specialties()], ['Кардиолог'])
+
+    @override_settings(LOCAL_CACHE=True, CATALOG_CACHE_LOCAL=True)
+    def test_opted_in_cache_is_reset_after_commit(self):
+        catalog.get_specialties()
+        with self.assertNumQueries(0):
+            catalog.get_specialties()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Specialty.objects.create(name='Кардиолог')
+
+        self.assertEqual(len(catalog.get_specialties()), 2)
+
+
+class SweepTests(TestCase):
+    def setUp(self):
+        self.now = datetime(2030, 1, 10, 12, 0)
+        self.specialty = Specialty.objects.create(name='Терапевт')
+        self.other_specialty = Specialty.objects.create(name='Хирург')
+        self.doctor = self.make_doctor('doc', self.specialty)
+        self.surgeon = self.make_doctor('surgeon', self.other_specialty)
+        patient_user = User.objects.create_user('pat', password='x')
+        self.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1), phone_number='1')
+        self.rules = [
+            {'outcome': 'completed', 'grace_minutes': 120},
+            {'specialty': self.other_specialty.id, 'outcome': 'no_show', 'grace_minutes': 0},
+        ]
+
+    def make_doctor(self, username, specialty):
+        return Doctor.objects.create(user=User.objects.create_user(username, password='x'), specialty=specialty)
+
+    def book(self, doctor, day, start, status='scheduled'):
+        slot = ScheduleSlot.objects.create(doctor=doctor, date=day, start_time=start,
+                                           end_time=time(start.hour, 30), status='booked')
+        appointment = Appointment.objects.create(patient=self.patient, slot=slot, status=status)
+        agenda.sync_slot(slot, appointment)
+        counters.add_slots([slot])
+        return appointment
+
+    def state(self, appointment):
+        appointment.refresh_from_db()
+        return appointment.status, appointment.slot.status, appointment.slot.agenda_entry.status
+
+    def test_sweep_applies_rules_and_keeps_doctor_outcome(self):
+        yesterday = self.now.date() - timedelta(days=1)
+        past = self.book(self.doctor, yesterday, time(10))
+        marked = self.book(self.doctor, yesterday, time(11), status='no_show')
+        surgery = self.book(self.surgeon, self.now.date(), time(11))
+        in_grace = self.book(self.doctor, self.now.date(), time(11))
+        upcoming = self.book(self.doctor, self.now.date() + timedelta(days=1), time(10))
+        reminder = ReminderOutbox.objects.create(appointment=past, kind='2h', channel='sms', recipient='1',
+                                                 message='m')
+
+        result = lifecycle.sweep(now=self.now, rules=self.rules, batch_size=1)
+
+        self.assertEqual((result['slots'], result['completed'], result['no_show'], result['reminders_cancelled']),
+                         (3, 1, 1, 1))
+        self.assertEqual(self.state(past), ('completed', 'completed', 'completed'))
+        self.assertEqual(self.state(marked), ('no_show', 'completed', 'completed'))
+        self.assertEqual(self.state(surgery), ('no_show', 'completed', 'completed'))
+        self.assertEqual(self.state(in_grace), ('scheduled', 'booked', 'booked'))
+        self.assertEqual(self.state(upcoming), ('scheduled', 'booked', 'booked'))
+        reminder.refresh_from_db()
+        self.assertEqual(reminder.status, 'cancelled')
+        self.assertEqual(counters.rebuild(), 0)
+
+    def test_dry_run_writes_nothing(self):
+        appointment = self.book(self.doctor, self.now.date() - timedelta(days=1), time(10))
+
+        with self.assertNumQueries(4):  # по два подсчета на правило
+            result = lifecycle.sweep(now=self.now, rules=self.rules, dry_run=True)
+
+        self.assertEqual((result['slots'], result['completed']), (1, 1))
+        self.assertEqual(self.state(appointment), ('scheduled', 'booked', 'booked'))
+
+
+class PeopleImportTests(TestCase):
+    def setUp(self):
+        self.specialty = Specialty.objects.create(name='Терапевт')
+
+    def run_import(self, is_active_column):
+        header = 'username,password,specialty,is_active\n'
+        rows = ''.join(
+            f'doc{i},Strong-pass-9051,{self.specialty.id},{value}\n' for i, value in enumerate(is_active_column)
+        )
+        return people_import.import_people(io.StringIO(header + rows), 'doctor', workers=0)
+
+    def test_blank_is_active_keeps_doctor_active(self):
+        report = self.run_import(['', 'false', 'yes', '0'])
+
+        self.assertEqual((report.created, report.errors), (4, []))
+        self.assertEqual(
+            list(Doctor.objects.order_by('user__username').values_list('user__username', 'is_active')),
+            [('doc0', True), ('doc1', False), ('doc2', True), ('doc3', False)],
+        )
+
+    def test_unknown_is_active_value_is_an_error(self):
+        report = self.run_import(['maybe'])
+
+        self.assertEqual(report.created, 0)
+        self.assertEqual(report.errors[0]['errors'], {'is_active': 'Must be one of: true, false, 1, 0, yes, no.'})
@@ -13,6 +13,11 @@ router.register(r'specialties', views.SpecialtyViewSet)
 router.register(r'slots', views.ScheduleSlotViewSet)
 router.register(r'appointments', views.AppointmentViewSet, basename="Appointments")
 router.register(r'working_hours', views.WorkingHoursViewSet)
+router.register(r'schedule_exceptions', views.ScheduleExceptionViewSet)
+router.register(r'agenda', views.AgendaViewSet, basename="Agenda")
+router.register(r'doctor_slots', views.DoctorSlotViewSet, basename="DoctorSlots")
+router.register(r'jobs', views.JobViewSet, basename="Jobs")
+router.register(r'waitlist', views.WaitlistViewSet, basename="Waitlist")
 
 urlpatterns = [
     path('', views.login_view, name="index"),  # Сделаем вход главной страницей
@@ -23,4 +28,9 @@ urlpatterns = [
     # API
     path('api/', include(router.urls)),
     path('api/me/', views.current_user_info, name='current_user_info'),
+    path('api/bootstrap/', views.bootstrap_view, name='bootstrap'),
+    path('api/token/', views.obtain_token, name='obtain_token'),
+    path('api/calendar/', views.slot_calendar, name='slot_calendar'),
+    path('api/analytics/utilization/', views.utilization_view, name='utilization'),
+    path('api/import_people/', views.import_people_view, name='import_people'),
 ]
@@ -1,17 +1,30 @@
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from datetime import datetime, timedelta, date, time
+from datetime import date, timedelta
+from django.conf import settings
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
+from django.db import transaction
+from django.db.models import Sum
 from django.http import JsonResponse
 from django.shortcuts import render, redirect
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, permission_classes, parser_classes, authentication_classes, \
+    renderer_classes
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework import viewsets, status
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Doctor, Patient, Specialty, Appointment, ScheduleSlot, WorkingHours
-from . import serializers
+from .models import Doctor, Patient, Specialty, Appointment, ScheduleSlot, WorkingHours, AgendaEntry, Job, \
+    ScheduleException, DailySlotCounter, WaitlistEntry
+from . import serializers, agenda, counters, jobs, scheduling, people_import, waitlist, booking, analytics, \
+    catalog, bootstrap
+from .filters import ScheduleSlotFilter
+from .renderers import CSVRenderer
+from .idempotency import idempotent
+from .authentication import make_token
 
 import logging
 
@@ -33,6 +46,40 @@ class WorkingHoursViewSet(viewsets.ModelViewSet):
         serializer.save(doctor=doctor)
 
 
+class ScheduleExceptionViewSet(viewsets.ModelViewSet):
+    queryset = ScheduleException.objects.all()
+    serializer_class = serializers.ScheduleExceptionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # Доктор видит только свои исключения из графика
+        return ScheduleException.objects.filter(doctor__user=self.request.user)
+
+    # Уже сгенерированные слоты приводим к новому графику сразу (см. scheduling.apply_exception_change)
+    def perform_create(self, serializer):
+        doctor = self.request.user.doctor_profile
+        with transaction.atomic():
+            exception = serializer.save(doctor=doctor)
+            scheduling.apply_exception_change(
+                doctor, exception.date_from, exception.date_to, generate=exception.kind == 'extra'
+            )
+
+    def perform_update(self, serializer):
+        old_from, old_to = serializer.instance.date_from, serializer.instance.date_to
+        with transaction.atomic():
+            exception = serializer.save()
+            # Старый период - чтобы вернуть слоты, которые исключение больше не закрывает
+            scheduling.apply_exception_change(exception.doctor, old_from, old_to)
+            scheduling.apply_exception_change(
+                exception.doctor, exception.date_from, exception.date_to, generate=exception.kind == 'extra'
+            )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            scheduling.apply_exception_change(instance.doctor, instance.date_from, instance.date_to)
+
+
 class DoctorSlotViewSet(viewsets.ModelViewSet):
     serializer_class = serializers.ScheduleSlotSerializer
     permission_classes = [IsAuthenticated]
@@ -45,79 +92,128 @@ class DoctorSlotViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         return Response({"detail": "Use 'generate_schedule' action."}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            old_status = serializer.instance.status
+            slot = serializer.save()
+            agenda.sync_slot(slot, getattr(slot, 'appointment', None))
+            counters.move(slot.doctor_id, slot.date, old_status, slot.status)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            counters.remove_slots([instance])
+            instance.delete()
+
     @action(detail=False, methods=['post'])
+    @idempotent
     def generate_schedule(self, request):
         """
-        Генерирует слоты на следующие N дней на основе WorkingHours
+        Ставит в очередь генерацию слотов на следующие N дней на основе WorkingHours.
+        Слоты создает воркер (manage.py run_worker), прогресс - GET /api/jobs/<id>/
         """
         doctor = request.user.doctor_profile
         days_ahead = 14  # Генерируем на 2 недели вперед
-        today = date.today()
-
-        created_count = 0
-
-        for i in range(days_ahead):
-            current_date = today + timedelta(days=i)
-            # isoweekday: 1=Mon, 7=Sun
-            weekday = current_date.isoweekday()
 
-            # Ищем настройки графика на этот день недели
-            working_hours = WorkingHours.objects.filter(doctor=doctor, day_of_week=weekday).first()
+        job = jobs.enqueue('generate_schedule', {
+            'doctor_id': doctor.id,
+            'start_date': date.today().isoformat(),
+            'days': days_ahead,
+        }, user=request.user, total=days_ahead)
 
-            if not working_hours:
-                continue  # В этот день врач не работает
+        return Response(
+            {"message": "Генерация расписания поставлена в очередь.", "job_id": job.id},
+            status=status.HTTP_202_ACCEPTED
+        )
 
-            # Логика генерации слотов
-            start_dt = datetime.combine(current_date, working_hours.start_time)
-            end_dt = datetime.combine(current_date, working_hours.end_time)
 
-            current_slot_start = start_dt
-
-            while current_slot_start + timedelta(minutes=doctor.appointment_duration) <= end_dt:
-                slot_end = current_slot_start + timedelta(minutes=doctor.appointment_duration)
-
-                # Проверяем, не существует ли уже такой слот (чтобы не дублировать)
-                if not ScheduleSlot.objects.filter(
-                        doctor=doctor,
-                        date=current_date,
-                        start_time=current_slot_start.time()
-                ).exists():
-                    ScheduleSlot.objects.create(
-                        doctor=doctor,
-                        date=current_date,
-                        start_time=current_slot_start.time(),
-                        end_time=slot_end.time(),
-                        status='free'
-                    )
-                    created_count += 1
-
-                current_slot_start = slot_end
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = serializers.JobSerializer
+    permission_classes = [IsAuthenticated]
 
-        return Response({"message": f"Сгенерировано {created_count} новых слотов."})
+    def get_queryset(self):
+        # Пользователь видит только свои задачи, админ - все
+        if self.request.user.is_staff:
+            return Job.objects.all()
+        return Job.objects.filter(created_by=self.request.user)
 
 
 class DoctorViewSet(viewsets.ModelViewSet):
     queryset = Doctor.objects.all()
     serializer_class = serializers.DoctorSerializer
 
+    def list(self, request, *args, **kwargs):
+        # Список врачей - справочник из кеша (api/catalog.py)
+        return Response(catalog.get_doctors())
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
 
 class PatientViewSet(viewsets.ModelViewSet):
     queryset = Patient.objects.all()
     serializer_class = serializers.PatientSerializer
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
 
 class SpecialtyViewSet(viewsets.ModelViewSet):
     queryset = Specialty.objects.all()
     serializer_class = serializers.SpecialtySerializer
 
+    def list(self, request, *args, **kwargs):
+        return Response(catalog.get_specialties())
+
 
 class ScheduleSlotViewSet(viewsets.ModelViewSet):
-    queryset = ScheduleSlot.objects.all()
+    # Врач, специальность и пациент нужны сериализатору для каждой строки - забираем их одним join'ом
+    queryset = ScheduleSlot.objects.select_related(
+        'doctor__user', 'doctor__specialty', 'appointment__patient__user'
+    ).order_by('date', 'start_time')
     serializer_class = serializers.ScheduleSlotSerializer
     # Добавляем фильтрацию, чтобы клиент мог запросить только свободные слоты
-    # Пример запроса: /api/slots/?doctor=1&status=free&date=2023-10-27
+    # Пример запроса: /api/slots/?doctor=1&status=free&date=2023-10-27 (остальные фильтры - в api/filters.py)
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['doctor', 'date', 'status']
+    filterset_class = ScheduleSlotFilter
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            old_status = serializer.instance.status
+            slot = serializer.save()
+            agenda.sync_slot(slot, getattr(slot, 'appointment', None))
+            counters.move(slot.doctor_id, slot.date, old_status, slot.status)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            counters.remove_slots([instance])
+            instance.delete()
+
+
+class AgendaViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Расписание текущего врача из денормализованной таблицы AgendaEntry.
+    Пример запроса: /api/agenda/?date_from=2025-12-01&date_to=2025-12-07
+    """
+    serializer_class = serializers.AgendaEntrySerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'slot_id'
+
+    def get_queryset(self):
+        # Один range scan по индексу (doctor, date, start_time)
+        queryset = AgendaEntry.objects.filter(doctor__user=self.request.user)
+        params = self.request.query_params
+        try:
+            date_from = date.fromisoformat(params['date_from']) if params.get('date_from') else None
+            date_to = date.fromisoformat(params['date_to']) if params.get('date_to') else None
+        except ValueError:
+            raise ValidationError({"detail": "Invalid date_from or date_to."})
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+        return queryset.order_by('date', 'start_time')
 
 
 class AppointmentViewSet(viewsets.ModelViewSet):
@@ -135,34 +231,195 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         # Иначе (админ) возвращаем всё
         return Appointment.objects.all()
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def next_available(self, request):
+        """
+        Записывает на ближайший свободный слот у врачей/специальности в заданном окне.
+        Слот выбирает сервер, поэтому параллельные пациенты не соревнуются за один и тот же слот.
+        """
+        params = serializers.NextAvailableSerializer(data=request.data, context={'request': request})
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        appointment = booking.book_next_available(
+            data['patient'],
+            date_from=data.get('date_from', date.today()),
+            date_to=data['date_to'],
+            doctor_ids=[doctor.id for doctor in data.get('doctors', [])],
+            specialty_id=data['specialty'].id if data.get('specialty') else None,
+            time_from=data.get('time_from'),
+            time_to=data.get('time_to'),
+        )
+        if appointment is None:
+            return Response({"detail": "Нет свободных слотов в заданном окне."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.get_serializer(appointment).data, status=status.HTTP_201_CREATED)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            appointment = serializer.save()
+            # Статус записи (например, no_show) попадает в аналитику через измененный день
+            counters.touch(appointment.slot.doctor_id, appointment.slot.date)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # Слот блокируется первым, как при записи и в листе ожидания; запись и статус слота
+            # перечитываются под блокировкой - get_object() читал их без нее
+            slot = (
+                ScheduleSlot.objects.select_for_update(of=('self',)).select_related('doctor')
+                .get(pk=instance.slot_id)
+            )
+            if not Appointment.objects.select_for_update().filter(pk=instance.pk).exists():
+                return  # запись уже отменил параллельный запрос
+            if slot.status != 'booked':
+                raise ValidationError({'detail': 'Прошедшую запись отменить нельзя.'})
+            slot.status = 'free'
+            slot.save(update_fields=['status'])
+            instance.delete()
+            agenda.sync_slot(slot)
+            counters.move(slot.doctor_id, slot.date, 'booked', 'free')
+            # Освободившийся слот сразу предлагаем первому подходящему из листа ожидания
+            waitlist.offer_slot(slot)
+
+
+class WaitlistViewSet(viewsets.ModelViewSet):
+    serializer_class = serializers.WaitlistEntrySerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+
+    def get_queryset(self):
+        # Пациент видит только свои заявки
+        return WaitlistEntry.objects.filter(patient__user=self.request.user).select_related(
+            'offered_slot__doctor__user', 'offered_slot__doctor__specialty'
+        ).order_by('-created_at')
+
+    def perform_create(self, serializer):
+        serializer.save(patient=self.request.user.patient_profile)
+
     def perform_destroy(self, instance):
-        slot = instance.slot
-        slot.status = 'free'
-        slot.save()
-        instance.delete()
+        # Заявку не удаляем, а отменяем; придержанный слот отдаем следующему в очереди
+        waitlist.cancel_entry(instance.pk)
 
 
 # --- API для получения инфо о текущем пользователе ---
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def current_user_info(request):
-    user = request.user
-    data = {
-        'id': user.id,
-        'username': user.username,
-        'role': None,
-        'profile_id': None
-    }
-
     # Проверяем, кто это: врач или пациент
-    if hasattr(user, 'patient_profile'):
-        data['role'] = 'patient'
-        data['profile_id'] = user.patient_profile.id
-    elif hasattr(user, 'doctor_profile'):
-        data['role'] = 'doctor'
-        data['profile_id'] = user.doctor_profile.id
+    return JsonResponse(bootstrap.user_info(request.user))
 
-    return JsonResponse(data)
+
+# --- Все начальные данные dashboard одним запросом ---
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def bootstrap_view(request):
+    return Response(bootstrap.bootstrap_data(request.user))
+
+
+# --- Токен для API-клиентов (без сессии) ---
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def obtain_token(request):
+    user = authenticate(request, username=request.data.get('username'), password=request.data.get('password'))
+    if user is None:
+        return Response({"detail": "Invalid username or password."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        "token": make_token(user),
+        "expires_in": settings.API_TOKEN_MAX_AGE,
+    })
+
+
+# --- Массовый импорт пациентов/врачей (для администратора) ---
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser])
+def import_people_view(request):
+    """
+    Принимает файл CSV/NDJSON (поле file) и роль (patient/doctor) и ставит импорт в очередь.
+    Импорт выполняет воркер (manage.py run_worker); сводку и ошибки по строкам - GET /api/jobs/<id>/
+    """
+    upload = request.FILES.get('file')
+    role = request.data.get('role')
+    if upload is None or role not in people_import.ROLES:
+        return Response({"detail": "Specify file and role (patient or doctor)."}, status=status.HTTP_400_BAD_REQUEST)
+    fmt = request.data.get('format') or ('ndjson' if upload.name.endswith(('.ndjson', '.jsonl')) else 'csv')
+    if fmt not in people_import.FORMATS:
+        return Response({"detail": "Format must be csv or ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+
+    name = people_import.save_upload(upload, fmt)
+    job = jobs.enqueue('import_people', {'file': name, 'role': role, 'format': fmt}, user=request.user)
+    return Response({"message": "Импорт поставлен в очередь.", "job_id": job.id}, status=status.HTTP_202_ACCEPTED)
+
+
+# --- Календарь свободных слотов (по счетчикам DailySlotCounter) ---
+@api_view(['GET'])
+def slot_calendar(request):
+    """
+    Количество свободных/занятых слотов по дням для врача или специальности.
+    Пример запроса: /api/calendar/?specialty=2&date_from=2025-12-01&days=90
+    """
+    params = request.query_params
+    try:
+        date_from = date.fromisoformat(params['date_from']) if 'date_from' in params else date.today()
+        days = min(int(params.get('days', 90)), 366)
+        doctor_id = int(params['doctor']) if 'doctor' in params else None
+        specialty_id = int(params['specialty']) if 'specialty' in params else None
+    except ValueError:
+        return Response({"detail": "Invalid date_from, days, doctor or specialty."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    date_to = date_from + timedelta(days=days - 1)
+
+    # Строки с нулями остаются от дней, слоты которых удалены (см. counters.rebuild)
+    queryset = DailySlotCounter.objects.filter(date__range=(date_from, date_to)).exclude(total=0)
+    if doctor_id is not None:
+        rows = queryset.filter(doctor_id=doctor_id).values('date', 'free', 'booked', 'total')
+    elif specialty_id is not None:
+        rows = queryset.filter(doctor__specialty_id=specialty_id).values('date').annotate(
+            free=Sum('free'), booked=Sum('booked'), total=Sum('total')
+        )
+    else:
+        return Response({"detail": "Specify doctor or specialty."}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(list(rows.order_by('date')))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, CSVRenderer])
+def utilization_view(request):
+    """
+    Загрузка врачей из сводок DailyUtilization (их заполняет manage.py rollup_stats).
+    Пример запроса: /api/analytics/utilization/?group_by=specialty,week&date_from=2025-09-01&date_to=2025-11-30
+    Фильтры: doctor (несколько через запятую), specialty. CSV: &format=csv
+    """
+    params = request.query_params
+    group_by = [group for group in params.get('group_by', 'doctor').split(',') if group]
+    if not group_by or any(group not in analytics.GROUPS for group in group_by):
+        return Response({"detail": f"group_by: one or more of {', '.join(analytics.GROUPS)}."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        date_to = date.fromisoformat(params['date_to']) if 'date_to' in params else date.today()
+        date_from = date.fromisoformat(params['date_from']) if 'date_from' in params \
+            else date_to - timedelta(weeks=12)
+        doctor_ids = [int(pk) for pk in params['doctor'].split(',')] if params.get('doctor') else None
+        specialty_id = int(params['specialty']) if params.get('specialty') else None
+    except ValueError:
+        return Response({"detail": "Invalid date_from, date_to, doctor or specialty."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if date_from > date_to or (date_to - date_from).days > 731:
+        return Response({"detail": "The period must be from 1 day to 2 years."}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = analytics.utilization(group_by, date_from, date_to, doctor_ids, specialty_id)
+    response = Response(rows)
+    if request.accepted_renderer.format == 'csv':
+        response['Content-Disposition'] = (
+            f'attachment; filename="utilization-{"-".join(group_by)}-{date_from}-{date_to}.csv"'
+        )
+    return response
 
 
 # --- Представления для HTML страниц ---
@@ -192,10 +449,11 @@ def register_view(request):
 @login_required(login_url='/login/')
 def dashboard_view(request):
     user = request.user
+    # Начальные данные встраиваются в страницу - при загрузке она не обращается к API
     if hasattr(user, 'patient_profile'):
-        return render(request, 'patient_dashboard.html')
+        return render(request, 'patient_dashboard.html', {'bootstrap': bootstrap.bootstrap_data(user)})
     elif hasattr(user, 'doctor_profile'):
-        return render(request, 'doctor_dashboard.html')
+        return render(request, 'doctor_dashboard.html', {'bootstrap': bootstrap.bootstrap_data(user)})
     else:
         # Если пользователь есть, но профиля нет (например, админ)
         return render(request, 'index.html', {'message': 'У вас нет профиля врача или пациента'})
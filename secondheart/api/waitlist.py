@@ -0,0 +1,120 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import WaitlistEntry, ScheduleSlot, AgendaEntry
+from . import agenda, counters
+
+
+def _hold_ttl():
+    return timedelta(seconds=getattr(settings, 'WAITLIST_HOLD_TTL', 15 * 60))
+
+
+def offer_slot(slot):
+    """
+    Придерживает освободившийся свободный слот за лучшей подходящей заявкой из листа ожидания:
+    к этому врачу или к его специальности (без конкретного врача), с датой слота в диапазоне.
+    Вызывается в транзакции, освободившей слот. Возвращает заявку или None.
+    """
+    entry = (
+        WaitlistEntry.objects.select_for_update(skip_locked=True)
+        .filter(status='waiting', date_from__lte=slot.date, date_to__gte=slot.date)
+        .filter(Q(doctor_id=slot.doctor_id) | Q(doctor__isnull=True, specialty_id=slot.doctor.specialty_id))
+        .order_by('-priority', 'created_at')
+        .first()
+    )
+    if entry is None:
+        return None
+
+    slot.status = 'held'
+    slot.save(update_fields=['status'])
+    entry.status = 'offered'
+    entry.offered_slot = slot
+    entry.offer_expires_at = timezone.now() + _hold_ttl()
+    entry.save(update_fields=['status', 'offered_slot', 'offer_expires_at'])
+    agenda.sync_slot(slot)
+    counters.move(slot.doctor_id, slot.date, 'free', 'held')
+    return entry
+
+
+def cancel_entry(entry_id):
+    """
+    Отменяет заявку; придержанный за ней слот отдает следующему в очереди. Блокирует сначала слот,
+    потом заявку - в том же порядке, что и запись на прием (AppointmentSerializer.create)
+    и release_expired, иначе встречные транзакции взаимно блокируются. Возвращает заявку.
+    """
+    while True:
+        with transaction.atomic():
+            slot_id = WaitlistEntry.objects.filter(pk=entry_id).values_list('offered_slot_id', flat=True).first()
+            slot = None
+            if slot_id is not None:
+                slot = (
+                    ScheduleSlot.objects.select_for_update(of=('self',)).select_related('doctor')
+                    .filter(pk=slot_id).first()
+                )
+            entry = WaitlistEntry.objects.select_for_update().get(pk=entry_id)
+            if entry.offered_slot_id != slot_id:
+                # Заявке успели предложить другой слот - повторяем, заблокировав его первым
+                continue
+            if entry.status in ('waiting', 'offered'):
+                entry.status = 'cancelled'
+                entry.offered_slot = None
+                entry.save(update_fields=['status', 'offered_slot'])
+                # Статус проверяется по заблокированной строке: слот мог уже быть занят
+                if slot is not None and slot.status == 'held':
+                    slot.status = 'free'
+                    slot.save(update_fields=['status'])
+                    agenda.sync_slot(slot)
+                    counters.move(slot.doctor_id, slot.date, 'held', 'free')
+                    offer_slot(slot)
+            return entry
+
+
+def release_expired(batch_size=500, reoffer=True):
+    """
+    Освобождает одну пачку истекших удержаний. Возвращает число обработанных заявок;
+    вызывать в цикле, пока не вернет 0.
+    """
+    now = timezone.now()
+    expired = WaitlistEntry.objects.filter(status='offered', offer_expires_at__lt=now)
+    with transaction.atomic():
+        # Сначала слоты, потом заявки - порядок блокировок общий с записью на прием и cancel_entry.
+        # Слоты, которые сейчас бронируются, пропускаем: их заявки дождутся следующего прохода
+        released = list(
+            ScheduleSlot.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(status='held', id__in=expired.values('offered_slot_id'))
+            .select_related('doctor')
+            .order_by('id')[:batch_size]
+        )
+        released_ids = [slot.id for slot in released]
+        entries = list(
+            expired.select_for_update(skip_locked=True, of=('self',))
+            .filter(
+                Q(offered_slot_id__in=released_ids) | Q(offered_slot__isnull=True) | ~Q(offered_slot__status='held')
+            )
+            .order_by('offer_expires_at')[:batch_size]
+        )
+        if not entries:
+            return 0
+        # Слот, заявку которого заблокировал кто-то другой, не трогаем
+        locked_slot_ids = {entry.offered_slot_id for entry in entries}
+        released = [slot for slot in released if slot.id in locked_slot_ids]
+        released_ids = [slot.id for slot in released]
+
+        WaitlistEntry.objects.filter(id__in=[entry.id for entry in entries]).update(
+            status='expired', offered_slot=None
+        )
+        ScheduleSlot.objects.filter(id__in=released_ids).update(status='free')
+        AgendaEntry.objects.filter(slot_id__in=released_ids).update(status='free')
+        for (doctor_id, day), count in Counter((slot.doctor_id, slot.date) for slot in released).items():
+            counters.move(doctor_id, day, 'held', 'free', count)
+
+        if reoffer:
+            for slot in released:
+                slot.status = 'free'
+                offer_slot(slot)
+    return len(entries)
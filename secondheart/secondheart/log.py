@@ -0,0 +1,118 @@
+"""
+Вспомогательные классы для settings.LOGGING.
+
+Потоки запросов только кладут записи в очередь в памяти; форматирование в JSON
+и запись в поток вывода выполняет фоновый поток QueueListener.
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# Стандартные атрибуты LogRecord - все остальное пришло через extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись; поля из extra= (например sql, duration) попадают в объект."""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    QueueHandler со своим QueueListener и потоковым обработчиком.
+    Форматтер, назначенный через dictConfig, применяется уже в потоке слушателя.
+
+    Поток слушателя запускается при первой записи, а не при настройке логирования: процессы,
+    которые ничего не пишут (в т.ч. дочерние после fork), его не создают. Потоки родителя в дочерний
+    процесс не переходят, поэтому после fork слушатель запускается заново со своей очередью.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.maxsize = maxsize
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Блокировка могла быть захвачена потоком родителя в момент fork
+        self._start_lock = threading.Lock()
+        self.queue = queue.Queue(self.maxsize)
+        self.listener = None
+        self._listener_pid = None
+
+    def _ensure_listener(self):
+        if self._listener_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._listener_pid != os.getpid():
+                self.listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+                self.listener.start()
+                atexit.register(self.listener.stop)
+                self._listener_pid = os.getpid()
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Подставляем аргументы в сообщение и сериализуем traceback здесь,
+        # остальное форматирование остается слушателю
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Под перегрузкой теряем запись, но не блокируем обработку запроса
+            pass
+
+
+class SqlSampleFilter(logging.Filter):
+    """
+    Пропускает записи django.db.backends только для медленных запросов
+    (duration >= slow_ms) и для случайной доли sample_rate остальных.
+    """
+
+    def __init__(self, sample_rate=0.0, slow_ms=200):
+        super().__init__()
+        self.sample_rate = float(sample_rate)
+        self.slow_ms = float(slow_ms)
+
+    def filter(self, record):
+        duration = getattr(record, 'duration', None)
+        if duration is not None and duration * 1000 >= self.slow_ms:
+            record.slow_query = True
+            return True
+        return random.random() < self.sample_rate
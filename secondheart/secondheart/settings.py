@@ -11,7 +11,6 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-import logging
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +50,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api.profiling.ProfilerMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -94,6 +94,54 @@ DATABASES = {
 }
 
 
+# Cache
+# По умолчанию - локальный кеш процесса; при нескольких процессах/контейнерах укажите
+# общий кеш, например CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# и CACHE_LOCATION=redis://redis:6379/0 (нужен пакет redis).
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    }
+}
+
+
+# Sessions and authentication
+# cached_db читает сессию из кеша, signed_cookies не обращается к БД вовсе. Оба кеша (сессий и
+# пользователей) должны быть общими для процессов: удаление из LocMemCache видно только своему
+# процессу, поэтому с ним сессии по умолчанию хранятся в БД, а пользователи не кешируются.
+
+LOCAL_CACHE = CACHES["default"]["BACKEND"].endswith("LocMemCache")
+
+SESSION_ENGINE = os.environ.get(
+    "SESSION_ENGINE",
+    "django.contrib.sessions.backends.db" if LOCAL_CACHE else "django.contrib.sessions.backends.cached_db",
+)
+
+AUTHENTICATION_BACKENDS = ["api.authentication.CachedModelBackend"]
+
+AUTH_USER_CACHE_TTL = int(os.environ.get("AUTH_USER_CACHE_TTL", 60))  # секунды
+AUTH_USER_CACHE_ALIAS = "default"
+# Разрешить кеш пользователей в LocMemCache - только если приложение работает одним процессом
+AUTH_USER_CACHE_LOCAL = os.environ.get("AUTH_USER_CACHE_LOCAL", "0") == "1"
+
+# Справочники специальностей и врачей в кеше (api/catalog.py)
+CATALOG_CACHE_TTL = int(os.environ.get("CATALOG_CACHE_TTL", 300))  # секунды
+# Как и для пользователей: LocMemCache допустим, только если приложение работает одним процессом
+CATALOG_CACHE_LOCAL = os.environ.get("CATALOG_CACHE_LOCAL", "0") == "1"
+
+API_TOKEN_MAX_AGE = int(os.environ.get("API_TOKEN_MAX_AGE", 24 * 60 * 60))  # секунды
+
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "rest_framework.authentication.SessionAuthentication",
+        "api.authentication.SignedTokenAuthentication",
+        "rest_framework.authentication.BasicAuthentication",
+    ],
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -136,7 +184,91 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s %(levelname)s %(message)s',
-)
+# Idempotency-Key для POST-запросов (api/idempotency.py)
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))  # секунды
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get("IDEMPOTENCY_WAIT_TIMEOUT", 10))  # секунды
+# Дольше запрос не выполняется (таймаут воркера): ключ в processing старше этого брошен
+IDEMPOTENCY_PROCESSING_LEASE = int(os.environ.get("IDEMPOTENCY_PROCESSING_LEASE", 120))  # секунды
+
+# Загруженные через API файлы импорта людей до обработки воркером (api/people_import.py);
+# каталог должен быть общим для web и worker
+IMPORT_UPLOAD_DIR = os.environ.get("IMPORT_UPLOAD_DIR", str(BASE_DIR / "imports"))
+
+# Сколько освободившийся слот придерживается за пациентом из листа ожидания (api/waitlist.py)
+WAITLIST_HOLD_TTL = int(os.environ.get("WAITLIST_HOLD_TTL", 15 * 60))  # секунды
+
+# Профилирование запросов (api/profiling.py): сотрудник включает его заголовком "X-Profile: 1"
+# или параметром ?_profile=1; кроме того, профилируется каждый N-й запрос (0 - выключено)
+PROFILER_SAMPLE_EVERY = int(os.environ.get("PROFILER_SAMPLE_EVERY", 0))
+PROFILER_KEEP = int(os.environ.get("PROFILER_KEEP", 500))  # сколько последних профилей хранить
+
+# Напоминания о приеме (api/reminders.py): транспорт отправки и файл для api.reminders.FileTransport
+REMINDER_TRANSPORT = os.environ.get("REMINDER_TRANSPORT", "api.reminders.ConsoleTransport")
+REMINDER_FILE_PATH = os.environ.get("REMINDER_FILE_PATH", str(BASE_DIR / "reminders.jsonl"))
+# Пауза перед повтором неудачной отправки удваивается с каждой попыткой, но не больше максимума
+REMINDER_RETRY_DELAY = int(os.environ.get("REMINDER_RETRY_DELAY", 60))  # секунды
+REMINDER_RETRY_MAX_DELAY = int(os.environ.get("REMINDER_RETRY_MAX_DELAY", 3600))  # секунды
+
+# Перевод прошедших приемов в итоговые статусы (api/lifecycle.py, команда sweep_appointments).
+# outcome - итог записи, которую врач не отметил сам (completed или no_show), grace_minutes - сколько
+# ждать после окончания приема; правило с "specialty": <id> действует для врачей этой специальности
+SWEEP_RULES = [
+    {
+        "outcome": os.environ.get("SWEEP_OUTCOME", "completed"),
+        "grace_minutes": int(os.environ.get("SWEEP_GRACE_MINUTES", 120)),
+    },
+]
+
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+# Записи пишутся через очередь (secondheart/log.py), поэтому потоки запросов не ждут вывода.
+# SQL-запросы (django.db.backends, только при DEBUG) логируются, если они медленнее
+# SQL_SLOW_QUERY_MS, и для доли SQL_LOG_SAMPLE_RATE остальных.
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {
+            "()": "secondheart.log.JsonFormatter",
+        },
+        "text": {
+            "format": "%(asctime)s %(levelname)s %(name)s %(message)s",
+        },
+    },
+    "filters": {
+        "sql_sample": {
+            "()": "secondheart.log.SqlSampleFilter",
+            "sample_rate": os.environ.get("SQL_LOG_SAMPLE_RATE", "0"),
+            "slow_ms": os.environ.get("SQL_SLOW_QUERY_MS", "200"),
+        },
+    },
+    "handlers": {
+        "queue": {
+            "()": "secondheart.log.QueueListenerHandler",
+            "stream": "ext://sys.stderr",
+            "formatter": os.environ.get("LOG_FORMAT", "json"),
+        },
+    },
+    "root": {
+        "handlers": ["queue"],
+        "level": LOG_LEVEL,
+    },
+    "loggers": {
+        "django": {
+            "level": os.environ.get("DJANGO_LOG_LEVEL", LOG_LEVEL),
+        },
+        "django.db.backends": {
+            "level": os.environ.get("SQL_LOG_LEVEL", "DEBUG"),
+            "filters": ["sql_sample"],
+        },
+        # Фильтр логгера не действует на записи дочерних логгеров - задаем его и здесь
+        "django.db.backends.schema": {
+            "level": os.environ.get("SQL_LOG_LEVEL", "DEBUG"),
+            "filters": ["sql_sample"],
+        },
+    },
+}